@@ -0,0 +1,112 @@
+"""
+Offline report over the archive manifest: per-category hit rates and LLM latency distributions.
+Only the manifest parts are read, never the archived drawings.
+
+    python archive_report.py --dir ./archive --room default
+    python archive_report.py --bucket my-bucket --room default --date 2026-10-17 --json
+"""
+import argparse, json, sys
+import numpy as np
+from typing import Any, Dict, List
+
+from components.archive import LocalSink, S3Sink, read_manifest
+
+
+# Outcomes that moved the puzzle forward (see components.game.DrawingOutcome)
+PROGRESS_OUTCOMES = ['found', 'stage1_complete', 'stage2_complete']
+PERCENTILES = [50, 90, 95, 99]
+
+
+def latency_summary(latency: np.ndarray) -> Dict[str, Any]:
+    if latency.size == 0:
+        return {'count': 0}
+    points = np.percentile(latency, PERCENTILES)
+    return {
+        'count': int(latency.size),
+        'mean': round(float(latency.mean()), 4),
+        **{f'p{p}': round(float(v), 4) for p, v in zip(PERCENTILES, points)},
+        'max': round(float(latency.max()), 4),
+    }
+
+
+def build_report(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """One vectorized pass over the manifest columns"""
+    total = len(records)
+    if total == 0:
+        return {'submissions': 0, 'categories': {}}
+    category = np.array([r.get('category') or 'NONE' for r in records])
+    stage = np.array([r.get('stage', -1) for r in records], dtype=np.int64)
+    outcome = np.array([r.get('outcome') or '' for r in records])
+    latency = np.array([r.get('latency', np.nan) for r in records], dtype=np.float64)
+    # Parts written before records had a source only hold model answers
+    source = np.array([r.get('source') or 'model' for r in records])
+    progressed = np.isin(outcome, PROGRESS_OUTCOMES)
+    # Pre-filtered and cached answers take no model time, so they stay out of the latency figures
+    timed = ~np.isnan(latency) & (source == 'model')
+
+    names, inverse, counts = np.unique(category, return_inverse=True, return_counts=True)
+    hits = np.bincount(inverse, weights=progressed, minlength=len(names))
+    categories = {}
+    for i, name in enumerate(names):
+        mask = inverse == i
+        categories[str(name)] = {
+            'submissions': int(counts[i]),
+            'share': round(float(counts[i] / total), 4),
+            'hit_rate': round(float(hits[i] / counts[i]), 4),
+            'latency': latency_summary(latency[mask & timed]),
+        }
+
+    return {
+        'submissions': total,
+        'recognised_rate': round(float(np.mean(category != 'NONE')), 4),
+        'hit_rate': round(float(progressed.mean()), 4),
+        'by_stage': {int(s): int(n) for s, n in zip(*np.unique(stage, return_counts=True))},
+        'by_source': {str(s): int(n) for s, n in zip(*np.unique(source, return_counts=True))},
+        'latency': latency_summary(latency[timed]),
+        'categories': categories,
+    }
+
+
+def print_report(room: str, report: Dict[str, Any]):
+    print(f"Room {room}: {report['submissions']} submissions")
+    if not report['submissions']:
+        return
+    print(f"  recognised {report['recognised_rate']:.1%}, moved the puzzle forward {report['hit_rate']:.1%}, by stage {report['by_stage']}, by source {report['by_source']}")
+    overall = report['latency']
+    if overall['count']:
+        print(f"  latency p50 {overall['p50']:.3f}s  p95 {overall['p95']:.3f}s  p99 {overall['p99']:.3f}s  max {overall['max']:.3f}s")
+    print(f"  {'category':<10} {'n':>6} {'share':>7} {'hit':>7} {'p50':>8} {'p95':>8}")
+    for name, row in sorted(report['categories'].items(), key=lambda kv: -kv[1]['submissions']):
+        lat = row['latency']
+        p50 = f"{lat['p50']:.3f}" if lat['count'] else '-'
+        p95 = f"{lat['p95']:.3f}" if lat['count'] else '-'
+        print(f"  {name:<10} {row['submissions']:>6} {row['share']:>7.1%} {row['hit_rate']:>7.1%} {p50:>8} {p95:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarise archived drawings from the manifest')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--dir', help='local archive directory (ARCHIVE_DIR)')
+    source.add_argument('--bucket', help='S3 bucket (S3_BUCKET_NAME)')
+    parser.add_argument('--room', action='append', help='room to report on, repeatable (default: default)')
+    parser.add_argument('--date', help='only this date, YYYY-MM-DD')
+    parser.add_argument('--json', action='store_true', help='print JSON instead of a table')
+    args = parser.parse_args(argv)
+
+    if args.dir:
+        sink = LocalSink(args.dir)
+    else:
+        import boto3
+        sink = S3Sink(args.bucket, lambda: boto3.client('s3'))
+
+    reports = {room: build_report(read_manifest(sink, room, args.date)) for room in (args.room or ['default'])}
+    if args.json:
+        json.dump(reports, sys.stdout, indent=2)
+        print()
+    else:
+        for room, report in reports.items():
+            print_report(room, report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+import asyncio, json, logging, os, time, uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from components.imaging import Drawing
+from components.metrics import span
+
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+    'jpg': 'image/jpeg',
+    'gif': 'image/gif',
+    'webp': 'image/webp'
+}
+
+# Submissions live under archive/room=<room>/date=<YYYY-MM-DD>/, and the manifest parts listing them
+# under manifest/room=<room>/date=<YYYY-MM-DD>/, so one night of one room is a single small prefix
+ARCHIVE_PREFIX = 'archive'
+MANIFEST_PREFIX = 'manifest'
+
+# (key, body, content type) for one object to archive
+ArchiveObject = Tuple[str, bytes, Optional[str]]
+
+
+# ============== Sinks ==============
+
+class S3Sink:
+    def __init__(self, bucket: str, client_factory: Callable[[], Any]):
+        self.bucket = bucket
+        self.client_factory = client_factory  # called on first use, so the client is not built at import time
+        self._client = None
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            self._client = self.client_factory()
+        return self._client
+
+    def put(self, key: str, body: bytes, content_type: Optional[str] = None):
+        kwargs = {'ContentType': content_type} if content_type else {}
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=body, **kwargs)
+
+    def list(self, prefix: str) -> List[str]:
+        keys = []
+        for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=prefix):
+            keys.extend(obj['Key'] for obj in page.get('Contents', []))
+        return keys
+
+    def get(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+
+    def __str__(self):
+        return f's3://{self.bucket}'
+
+
+class LocalSink:
+    """Same layout in a local directory, for development and tests without S3"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def put(self, key: str, body: bytes, content_type: Optional[str] = None):
+        path = os.path.join(self.root, *key.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(body)
+
+    def list(self, prefix: str) -> List[str]:
+        base = os.path.join(self.root, *prefix.split('/'))
+        keys = []
+        for folder, _, files in os.walk(base):
+            rel = os.path.relpath(folder, self.root).replace(os.sep, '/')
+            keys.extend(f'{rel}/{name}' for name in files)
+        return sorted(keys)
+
+    def get(self, key: str) -> bytes:
+        with open(os.path.join(self.root, *key.split('/')), 'rb') as f:
+            return f.read()
+
+    def __str__(self):
+        return self.root
+
+
+# ============== Layout ==============
+
+def archive_objects(room_id: str, drawing: Drawing, chatbot_response: str, when: datetime) -> Tuple[List[ArchiveObject], str]:
+    """The drawing and reply for one submission, plus its key stem; the random suffix keeps same-second submissions apart"""
+    image_format = drawing.normalized_format
+    stem = f'{ARCHIVE_PREFIX}/room={room_id}/date={when:%Y-%m-%d}/{when:%H%M%S}_{uuid.uuid4().hex[:12]}'
+    return [
+        (f'{stem}_drawing.{image_format}', drawing.normalized_bytes, CONTENT_TYPES.get(image_format, 'image/png')),
+        (f'{stem}_response.txt', chatbot_response.encode('utf-8'), 'text/plain; charset=utf-8'),
+    ], stem
+
+
+def manifest_prefix(room_id: str) -> str:
+    return f'{MANIFEST_PREFIX}/room={room_id}/'
+
+
+def read_manifest(sink: Any, room_id: str, date: Optional[str] = None) -> List[Dict[str, Any]]:
+    """All manifest records of a room (optionally one date) without touching the archived objects"""
+    prefix = manifest_prefix(room_id) + (f'date={date}/' if date else '')
+    records = []
+    for key in sink.list(prefix):
+        if key.endswith('.jsonl'):
+            records.extend(json.loads(line) for line in sink.get(key).decode('utf-8').splitlines() if line.strip())
+    return records
+
+
+# ============== Uploader ==============
+
+class ArchiveUploader:
+    """
+    Archives submissions from background workers so /chatbot never waits on storage.
+    Jobs wait in a bounded queue (new ones are dropped when it is full) and are uploaded by
+    `concurrency` workers sharing one sink. Each archived submission adds a record to the room's
+    manifest, written as a new JSON Lines part once `manifest_batch` records of a (room, date) are buffered
+    or the oldest is `manifest_interval` seconds old, so a busy night is a few parts rather than one per
+    submission. Records of a failed part write are kept for the next one; stop() drains the queue and
+    flushes the remaining records on shutdown.
+    """
+
+    def __init__(self, sink: Optional[Any], max_queue: int = 256, concurrency: int = 4, manifest_batch: int = 50, manifest_interval: float = 60.0):
+        self.sink = sink
+        self.max_queue = max_queue
+        self.concurrency = max(1, concurrency)
+        self.manifest_batch = max(1, manifest_batch)
+        self.manifest_interval = manifest_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._pending: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}  # (room, date) -> manifest records
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.queued = 0
+        self.uploaded = 0
+        self.dropped = 0
+        self.failed = 0
+        self.manifest_parts = 0
+        self.manifest_failures = 0
+        self._oldest_pending: Optional[float] = None
+        self.total_upload_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sink is not None
+
+    def start(self):
+        if not self.enabled or self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._flush_lock = asyncio.Lock()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        self._workers.append(asyncio.create_task(self._flush_periodically()))
+
+    async def stop(self, timeout: float = 10.0):
+        """Wait up to `timeout` for queued uploads to finish, flush the manifest and stop the workers"""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f'Archive drain timed out with {self._queue.qsize()} submissions still queued')
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await self.flush_manifest()
+
+    def submit(self, room_id: str, drawing: Drawing, chatbot_response: str, **details: Any) -> bool:
+        """
+        Queue a submission for archiving without waiting; returns False if it was dropped.
+        `details` (stage, category, outcome, source, latency, ...) go into its manifest record
+        """
+        if not self._workers:
+            return False
+        when = datetime.now(timezone.utc)
+        objects, stem = archive_objects(room_id, drawing, chatbot_response, when)
+        record = {
+            'key': objects[0][0],
+            'response_key': objects[1][0],
+            'room': room_id,
+            'timestamp': when.isoformat(),
+            **details,
+            'response': chatbot_response,
+        }
+        try:
+            self._queue.put_nowait((room_id, f'{when:%Y-%m-%d}', objects, record))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logging.warning(f'Archive queue full ({self.max_queue}), dropping {stem}')
+            return False
+        self.queued += 1
+        return True
+
+    async def _work(self):
+        while True:
+            room_id, date, objects, record = await self._queue.get()
+            start = time.perf_counter()
+            try:
+                with span('archive_put'):
+                    await asyncio.gather(*(asyncio.to_thread(self.sink.put, *obj) for obj in objects))
+                self.uploaded += 1
+                self._pending.setdefault((room_id, date), []).append(record)
+                if self._oldest_pending is None:
+                    self._oldest_pending = time.monotonic()
+                if self._manifest_due():
+                    await asyncio.shield(self.flush_manifest())
+            except Exception as e:
+                self.failed += 1
+                logging.error(f'Archiving {objects[0][0]} failed: {e}')
+            finally:
+                self.total_upload_seconds += time.perf_counter() - start
+                self._queue.task_done()
+
+    def _manifest_due(self) -> bool:
+        if time.monotonic() - self._oldest_pending >= self.manifest_interval:
+            return True
+        return any(len(records) >= self.manifest_batch for records in self._pending.values())
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.manifest_interval)
+            # Shielded so stop() cannot cancel a flush after it took the buffered records
+            await asyncio.shield(self.flush_manifest())
+
+    async def flush_manifest(self):
+        """Write every buffered record as one new manifest part per (room, date); parts are never rewritten"""
+        if self._flush_lock is None:
+            return
+        async with self._flush_lock:
+            pending, self._pending, self._oldest_pending = self._pending, {}, None
+            for (room_id, date), records in pending.items():
+                if not records:
+                    continue
+                key = f'{manifest_prefix(room_id)}date={date}/{datetime.now(timezone.utc):%H%M%S}_{uuid.uuid4().hex[:12]}.jsonl'
+                body = ''.join(json.dumps(r, default=str) + '\n' for r in records).encode('utf-8')
+                try:
+                    await asyncio.to_thread(self.sink.put, key, body, 'application/x-ndjson')
+                    self.manifest_parts += 1
+                except Exception as e:
+                    # Back in front of anything buffered since, for the next flush to retry
+                    self.manifest_failures += 1
+                    self._pending[(room_id, date)] = records + self._pending.get((room_id, date), [])
+                    self._oldest_pending = self._oldest_pending or time.monotonic()
+                    logging.error(f'Writing manifest part {key} failed, keeping {len(records)} records for the next flush: {e}')
+
+    def stats(self) -> Dict[str, Any]:
+        done = self.uploaded + self.failed
+        return {
+            'enabled': self.enabled,
+            'sink': str(self.sink) if self.sink is not None else None,
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'max_queue': self.max_queue,
+            'queued': self.queued,
+            'uploaded': self.uploaded,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'manifest_parts': self.manifest_parts,
+            'manifest_failures': self.manifest_failures,
+            'manifest_pending': sum(len(r) for r in self._pending.values()),
+            'avg_upload_seconds': round(self.total_upload_seconds / done, 4) if done else 0.0,
+        }
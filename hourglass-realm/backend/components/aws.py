@@ -0,0 +1,24 @@
+import threading
+from typing import Any, Callable, Dict
+
+
+# boto3 is imported and clients are built on first use, which keeps them out of the cold start
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+def shared_client(name: str, build: Callable[[], Any]) -> Any:
+    """One client per name and process, built by the first caller"""
+    if name not in _clients:
+        with _clients_lock:
+            if name not in _clients:
+                _clients[name] = build()
+    return _clients[name]
+
+def get_dynamodb():
+    import boto3
+    return shared_client('dynamodb', lambda: boto3.resource('dynamodb'))
+
+def get_s3_client(max_pool_connections: int = 10):
+    import boto3
+    from botocore.config import Config
+    return shared_client('s3', lambda: boto3.client('s3', config=Config(max_pool_connections=max_pool_connections)))
@@ -0,0 +1,88 @@
+import threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from components.imaging import hamming_distance
+
+
+class ClassificationCache:
+    """
+    Bounded LRU/TTL cache of classifier results keyed by (stage, pixel digest).
+    Misses on the exact digest fall back to the closest perceptual hash within max_distance bits, among the
+    entries put with near=True only: a near match is a guess, so results that change the game need the exact drawing.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0, max_distance: int = 8):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._entries: OrderedDict[Tuple[int, str], Tuple[Optional[int], Any, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, stage: int, digest: str, phash: int) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            key = (stage, digest)
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] > now:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry[1]
+
+            best_key, best_distance = None, self.max_distance + 1
+            for other_key, (other_phash, _, expires) in list(self._entries.items()):
+                if expires <= now:
+                    del self._entries[other_key]
+                    self.expirations += 1
+                    continue
+                if other_key[0] != stage or other_phash is None:
+                    continue
+                distance = hamming_distance(phash, other_phash)
+                if distance < best_distance:
+                    best_key, best_distance = other_key, distance
+            if best_key is not None:
+                self._entries.move_to_end(best_key)
+                self.near_hits += 1
+                return self._entries[best_key][1]
+
+            self.misses += 1
+            return None
+
+    def put(self, stage: int, digest: str, phash: int, value: Any, near: bool = True):
+        if not self.enabled:
+            return
+        with self._lock:
+            key = (stage, digest)
+            self._entries[key] = (phash if near else None, value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.exact_hits + self.near_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'exact_hits': self.exact_hits,
+            'near_hits': self.near_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.exact_hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
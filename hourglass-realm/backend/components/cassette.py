@@ -0,0 +1,137 @@
+import json, logging, os, threading, zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from components.imaging import hamming_distance
+
+
+MODES = ('off', 'record', 'replay')
+
+
+class CassetteMiss(LookupError):
+    pass
+
+
+class Cassette:
+    """
+    Records model answers as (stage, pixel digest) -> (category, response, latency, tokens), one JSON line
+    per call and no image data, and serves them back in place of the model.
+    Replay sleeps the recorded latency times `time_scale` (0 answers at once, 1 at recorded speed).
+    A replayed digest that was never recorded falls back to the closest perceptual hash within max_distance
+    bits; if there is none, strict replay raises CassetteMiss, otherwise a recording of the same stage
+    chosen from the digest is served, so synthetic drawings still get real answers and latencies.
+    """
+
+    def __init__(self, path: str, mode: str = 'off', time_scale: float = 1.0, max_distance: int = 4, strict: bool = True):
+        if mode not in MODES:
+            raise ValueError(f'Cassette mode must be one of {MODES}, not {mode!r}')
+        self.path = path
+        self.mode = mode
+        self.time_scale = max(0.0, time_scale)
+        self.max_distance = max_distance
+        self.strict = strict
+        self._entries: Optional[Dict[Tuple[int, str], List[Dict[str, Any]]]] = None  # loaded on first replay
+        self._by_stage: Dict[int, List[Dict[str, Any]]] = {}
+        self._plays: Dict[Tuple[int, str], int] = {}
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.replayed = 0
+        self.near_hits = 0
+        self.fallbacks = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'off'
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == 'record'
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == 'replay'
+
+    def record(self, stage: int, digest: str, phash: int, category: Optional[str], response: str, latency: float, usage: Optional[Dict[str, Any]] = None):
+        entry = {
+            'stage': stage,
+            'digest': digest,
+            'phash': phash,
+            'category': category,
+            'response': response,
+            'latency': round(latency, 4),
+            'input_tokens': (usage or {}).get('input_tokens'),
+            'output_tokens': (usage or {}).get('output_tokens'),
+            'cached_tokens': ((usage or {}).get('input_token_details') or {}).get('cache_read'),
+        }
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock:
+            # One append per call keeps lines whole even with several workers writing the same file
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+            self.recorded += 1
+
+    def _load(self):
+        entries: Dict[Tuple[int, str], List[Dict[str, Any]]] = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        entries.setdefault((entry['stage'], entry['digest']), []).append(entry)
+        else:
+            logging.warning(f'Cassette {self.path} does not exist, every replay will miss')
+        self._by_stage = {}
+        for (stage, _), recorded in sorted(entries.items()):
+            self._by_stage.setdefault(stage, []).extend(recorded)
+        self._entries = entries
+        logging.info(f'Loaded {sum(len(e) for e in entries.values())} recorded answers from {self.path}')
+
+    def replay(self, stage: int, digest: str, phash: int) -> Tuple[Dict[str, Any], float]:
+        """The recorded answer for this drawing and how long to wait before giving it"""
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            key = (stage, digest)
+            if key not in self._entries:
+                key = self._nearest(stage, phash)
+            if key is not None:
+                # Repeated submissions of one drawing cycle through its recordings in order
+                recorded = self._entries[key]
+                plays = self._plays.get(key, 0)
+                self._plays[key] = plays + 1
+                entry = recorded[plays % len(recorded)]
+            elif not self.strict and self._by_stage.get(stage):
+                self.fallbacks += 1
+                recorded = self._by_stage[stage]
+                entry = recorded[zlib.crc32(digest.encode()) % len(recorded)]
+            else:
+                self.misses += 1
+                raise CassetteMiss(f'No recorded answer for stage {stage} drawing {digest[:12]}')
+            self.replayed += 1
+        return entry, entry['latency'] * self.time_scale
+
+    def _nearest(self, stage: int, phash: int) -> Optional[Tuple[int, str]]:
+        best_key, best_distance = None, self.max_distance + 1
+        for key, recorded in self._entries.items():
+            if key[0] != stage:
+                continue
+            distance = hamming_distance(phash, recorded[0]['phash'])
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+        if best_key is not None:
+            self.near_hits += 1
+        return best_key
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'mode': self.mode,
+            'path': self.path if self.enabled else None,
+            'time_scale': self.time_scale,
+            'strict': self.strict,
+            'loaded': sum(len(e) for e in self._entries.values()) if self._entries is not None else 0,
+            'recorded': self.recorded,
+            'replayed': self.replayed,
+            'near_hits': self.near_hits,
+            'fallbacks': self.fallbacks,
+            'misses': self.misses,
+        }
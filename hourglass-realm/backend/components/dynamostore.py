@@ -0,0 +1,153 @@
+from contextlib import contextmanager
+from typing import Any, ContextManager, Dict, Iterable, List, Optional, Set, Tuple
+
+from botocore.exceptions import ClientError
+
+from components.aws import get_dynamodb, shared_client
+from components.metrics import span
+from components.rooms import DEFAULT_ROOM_ID
+from components.statecache import StateCache
+from components.statestore import RoomNotFound, StateStore
+from components.updates import StateUpdate
+
+
+GAME_STATE_ID = 'hourglass-realm-game-state'  # partition key of the default room, other rooms add '#<room_id>'
+SUMMARY_FIELDS = 'pk, version, created_at, target_time, puzzle_1b.completed_stage, complete'
+
+
+def room_key(room_id: str) -> Dict[str, str]:
+    """One item (and partition) per room; the default room keeps the original key"""
+    return {'pk': GAME_STATE_ID if room_id == DEFAULT_ROOM_ID else f'{GAME_STATE_ID}#{room_id}'}
+
+def key_room(pk: str) -> str:
+    return pk.partition('#')[2] or DEFAULT_ROOM_ID
+
+def _state(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in item.items() if k != 'pk'}
+
+
+class DynamoDBStateStore(StateStore):
+    """
+    Game state per room as one DynamoDB item, shared by every instance. Updates are conditional
+    update_items touching only the paths they name; reads go through a StateCache revalidated by a
+    projected (version, created_at) read. Writes cannot be batched: BatchWriteItem takes no conditions.
+    """
+    name = 'dynamodb'
+    shared = True
+
+    def __init__(self, table_name: str, cache_ttl: float = 2.0):
+        self.table_name = table_name
+        self.calls = {'get_item': 0, 'batch_get_item': 0, 'update_item': 0, 'put_item': 0, 'scan': 0}
+        self.updates = 0
+        self.conflicts = 0
+        # Read-mostly state (hints, target_time, master_codes, session epoch) is served from here;
+        # conditional updates still guard every write, so a slightly stale read can only cost a retry
+        self.cache = StateCache(load=self._load, load_stamp=self._load_stamp, ttl=cache_ttl)
+
+    @contextmanager
+    def _call(self, operation: str):
+        self.calls[operation] += 1
+        with span(f'dynamodb_{operation}'):
+            yield
+
+    def _table(self):
+        return shared_client(f'table:{self.table_name}', lambda: get_dynamodb().Table(self.table_name))
+
+    def _get_item(self, room_id: str, fields: Optional[List[str]] = None, consistent: bool = True) -> Dict[str, Any]:
+        kwargs = {}
+        if fields:
+            kwargs['ProjectionExpression'] = ', '.join(f'#f{i}' for i in range(len(fields)))
+            kwargs['ExpressionAttributeNames'] = {f'#f{i}': f for i, f in enumerate(fields)}
+        with self._call('get_item'):
+            item = self._table().get_item(Key=room_key(room_id), ConsistentRead=consistent, **kwargs).get('Item')
+        if not item:
+            raise RoomNotFound(room_id)
+        return item
+
+    def _load(self, room_id: str) -> Dict[str, Any]:
+        return _state(self._get_item(room_id))
+
+    def _load_stamp(self, room_id: str) -> Tuple[Any, Any]:
+        item = self._get_item(room_id, fields=['version', 'created_at'])
+        return item['version'], item['created_at']
+
+    def get(self, room_id: str, fresh: bool = False) -> Optional[Dict[str, Any]]:
+        try:
+            return self.cache.get(room_id, fresh=fresh)
+        except RoomNotFound:
+            return None
+
+    def stamp(self, room_id: str) -> Optional[Tuple[Any, Any]]:
+        try:
+            return self._load_stamp(room_id)
+        except RoomNotFound:
+            return None
+
+    def existing(self, room_ids: Iterable[str]) -> Set[str]:
+        """Which of these rooms already have a game state, in batched key-only reads"""
+        room_ids, found = list(room_ids), set()
+        for i in range(0, len(room_ids), 100):
+            with self._call('batch_get_item'):
+                response = get_dynamodb().batch_get_item(RequestItems={
+                    self.table_name: {'Keys': [room_key(r) for r in room_ids[i:i + 100]], 'ProjectionExpression': 'pk'}
+                })
+            found.update(key_room(item['pk']) for item in response['Responses'].get(self.table_name, []))
+        return found
+
+    def create(self, room_id: str, state: Dict[str, Any], replace: bool = False) -> bool:
+        kwargs = {} if replace else {'ConditionExpression': 'attribute_not_exists(pk)'}
+        try:
+            with self._call('put_item'):
+                self._table().put_item(Item={**room_key(room_id), **state}, **kwargs)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            return False
+        if replace:
+            self.cache.invalidate(room_id)
+        self.cache.store(room_id, state)
+        return True
+
+    def update(self, room_id: str, update: StateUpdate) -> Optional[Dict[str, Any]]:
+        try:
+            with self._call('update_item'):
+                response = self._table().update_item(Key=room_key(room_id), ReturnValues='ALL_NEW', **update.to_dynamodb())
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            self.conflicts += 1
+            return None
+        self.updates += 1
+        state = _state(response['Attributes'])
+        self.cache.store(room_id, state)
+        return state
+
+    def rooms(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Summary fields of every room (admin only, so a projected scan is acceptable)"""
+        items, kwargs = [], {}
+        while True:
+            with self._call('scan'):
+                response = self._table().scan(
+                    FilterExpression='begins_with(pk, :prefix)',
+                    ProjectionExpression=SUMMARY_FIELDS,
+                    ExpressionAttributeValues={':prefix': GAME_STATE_ID},
+                    **kwargs
+                )
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        return sorted(((key_room(item['pk']), _state(item)) for item in items), key=lambda room: room[0])
+
+    def request_scope(self) -> ContextManager:
+        return self.cache.request_scope()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'backend': self.name,
+            'table': self.table_name,
+            'updates': self.updates,
+            'conflicts': self.conflicts,
+            'calls': self.calls,
+            'cache': self.cache.stats(),
+        }
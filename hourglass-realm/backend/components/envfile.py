@@ -0,0 +1,14 @@
+import os
+
+
+ENV_FILE = os.getenv('ENV_FILE', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env'))
+
+
+def load_env_file(path: str = ENV_FILE):
+    """
+    Load `path` (backend/.env unless ENV_FILE says otherwise) into os.environ, leaving variables that are
+    already set alone. Components read their settings at import time, so entry points call this before importing them
+    """
+    if os.path.exists(path):
+        from dotenv import load_dotenv
+        load_dotenv(path)
@@ -0,0 +1,13 @@
+from typing import Any, Dict, Optional
+
+
+def state_etag(state: Dict[str, Any]) -> str:
+    """Strong ETag for a game state; created_at keeps it unique across resets, which restart version at 1"""
+    return f'"{state["version"]}-{state["created_at"]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates
@@ -0,0 +1,95 @@
+import asyncio, contextlib, json, logging, time
+from fastapi.encoders import jsonable_encoder
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+
+class StateBroadcaster:
+    """
+    Fans out game state changes to every open /events stream on this process.
+    State is pushed with publish() after local writes; when `poll` is given, one shared
+    background task also picks up changes made by other processes while anyone is subscribed.
+    """
+
+    def __init__(self, poll: Optional[Callable[[Optional[Dict[str, Any]]], Optional[Dict[str, Any]]]] = None, interval: float = 2.0):
+        self.poll = poll  # called in a thread with the last known state, returns a newer state or None
+        self.interval = interval
+        self.state: Optional[Dict[str, Any]] = None
+        self.subscribers = 0
+        self._changed: Optional[asyncio.Event] = None
+        self._poller: Optional[asyncio.Task] = None
+
+    def publish(self, state: Dict[str, Any]):
+        self.state = state
+        if self._changed is not None:
+            changed, self._changed = self._changed, asyncio.Event()
+            changed.set()
+
+    async def _poll_loop(self):
+        while self.subscribers > 0:
+            try:
+                state = await asyncio.to_thread(self.poll, self.state)
+                if state is not None:
+                    self.publish(state)
+            except Exception as e:
+                logging.warning(f'State poll for /events failed: {e}')
+            await asyncio.sleep(self.interval)
+        self._poller = None
+
+    async def subscribe(self, heartbeat: float) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield the current state, then every newer state; None is yielded when `heartbeat` passes quietly"""
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        self.subscribers += 1
+        if self.poll is not None and self._poller is None:
+            self._poller = asyncio.create_task(self._poll_loop())
+        try:
+            # Taken before each yield: a change published while the subscriber is busy with the last state still wakes it
+            changed = self._changed
+            yield self.state
+            while True:
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                changed = self._changed
+                yield self.state
+        finally:
+            self.subscribers -= 1
+
+
+async def game_event_stream(
+    broadcaster: StateBroadcaster,
+    token: str,
+    build_payload: Callable[[Dict[str, Any]], Dict[str, Any]],
+    heartbeat: float = 15.0,
+    max_seconds: float = 300.0,
+) -> AsyncIterator[str]:
+    """
+    Server-Sent Events for one portal: the /data payload on connect and whenever it changes,
+    an `expired` event once the session token is replaced, and comment pings in between.
+    The stream ends after max_seconds; EventSource reconnects on its own.
+    """
+    deadline = time.monotonic() + max_seconds
+    last_payload = None
+    yield 'retry: 3000\n\n'
+    # Closed on the way out, so the subscription (and the poller it keeps alive) ends with the stream
+    async with contextlib.aclosing(broadcaster.subscribe(heartbeat)) as states:
+        async for state in states:
+            if state is None:
+                yield ': ping\n\n'
+            elif state.get('active_token') != token:
+                yield 'event: expired\ndata: {}\n\n'
+                return
+            else:
+                payload = jsonable_encoder(build_payload(state))
+                if payload != last_payload:
+                    last_payload = payload
+                    yield f'data: {json.dumps(payload)}\n\n'
+            if time.monotonic() > deadline:
+                return
+
+
+def sse_event(event: str, data: Any) -> str:
+    """One named Server-Sent Event with a JSON payload (newlines in strings are escaped by json.dumps)"""
+    return f'event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n'
@@ -0,0 +1,97 @@
+import copy
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+from components.chatbot import ObjectCategory2
+from components.updates import StateUpdate
+
+
+STAGE1_TARGETS = ['CAR', 'HOUSE', 'LOVE', 'MONEY', 'FAMILY']
+
+
+class DrawingOutcome(Enum):
+    UNRECOGNISED = 'unrecognised'        # no category, reply unchanged
+    FOUND = 'found'                      # new stage 1 target
+    STAGE1_COMPLETE = 'stage1_complete'  # fifth stage 1 target, first PIN awarded
+    DUPLICATE = 'duplicate'              # stage 1 target drawn before
+    ALREADY_PINNED = 'already_pinned'    # stage 2, not the true treasure
+    STAGE2_COMPLETE = 'stage2_complete'  # stage 2 solved, true PIN awarded
+    FINISHED = 'finished'                # both stages already done
+
+
+def plan_drawing(state: Dict[str, Any], category: Optional[Enum]) -> Tuple[DrawingOutcome, Optional[StateUpdate]]:
+    """
+    Decide what a classified drawing does to the puzzle, as a conditional update that only touches
+    the fields involved, so concurrent submissions for other targets don't conflict with it
+    """
+    if category is None:
+        return DrawingOutcome.UNRECOGNISED, None
+    puzzle = state['puzzle_1b']
+    pins = state['master_codes']['puzzle_1b_pins']
+
+    if puzzle['completed_stage'] == 0:
+        category_str = category.name
+        if category_str not in puzzle['stage1_progress']:
+            return DrawingOutcome.UNRECOGNISED, None
+        if puzzle['stage1_progress'][category_str]:
+            return DrawingOutcome.DUPLICATE, None
+        flag = f'puzzle_1b.stage1_progress.{category_str}'
+        if puzzle['stage1_count'] + 1 == len(STAGE1_TARGETS):
+            return DrawingOutcome.STAGE1_COMPLETE, StateUpdate(
+                set={flag: True, 'puzzle_1b.stage1_count': len(STAGE1_TARGETS), 'puzzle_1b.completed_stage': 1},
+                append={'puzzle_1b.pins': pins[0]},
+                expect={'puzzle_1b.completed_stage': 0, flag: False, 'puzzle_1b.stage1_count': len(STAGE1_TARGETS) - 1},
+            )
+        return DrawingOutcome.FOUND, StateUpdate(
+            set={flag: True},
+            add={'puzzle_1b.stage1_count': 1},
+            expect={'puzzle_1b.completed_stage': 0, flag: False, 'puzzle_1b.stage1_count': ('<', len(STAGE1_TARGETS) - 1)},
+        )
+
+    elif puzzle['completed_stage'] == 1:
+        if category != ObjectCategory2.JESUS:
+            return DrawingOutcome.ALREADY_PINNED, None
+        return DrawingOutcome.STAGE2_COMPLETE, StateUpdate(
+            set={'puzzle_1b.completed_stage': 2},
+            append={'puzzle_1b.pins': pins[1]},
+            expect={'puzzle_1b.completed_stage': 1},
+        )
+
+    return DrawingOutcome.FINISHED, None
+
+
+def plan_drawings(state: Dict[str, Any], categories: List[Optional[Enum]]) -> Tuple[List[Tuple[DrawingOutcome, Dict[str, Any]]], Optional[StateUpdate]]:
+    """
+    plan_drawing for several drawings classified against the same state, taken in order as if submitted
+    one after another, but written as one update. Returns each outcome with the state after it (for its reply)
+    """
+    working = copy.deepcopy(state)
+    outcomes, updates = [], []
+    for category in categories:
+        outcome, update = plan_drawing(working, category)
+        if update is not None:
+            update.apply(working)
+            updates.append(update)
+        outcomes.append((outcome, copy.deepcopy(working)))
+    return outcomes, StateUpdate.combine(state, updates) if updates else None
+
+
+def reply_starts_with_response(outcome: DrawingOutcome) -> bool:
+    """Whether compose_reply keeps the classifier reply as its opening, so it can be streamed before the state is written"""
+    return outcome != DrawingOutcome.STAGE2_COMPLETE
+
+
+def compose_reply(response: str, outcome: DrawingOutcome, category: Optional[Enum], state: Dict[str, Any]) -> str:
+    """Append Dory's game-progress message to the classifier reply, given the state after the update"""
+    if outcome == DrawingOutcome.FOUND:
+        remaining = len(STAGE1_TARGETS) - state['puzzle_1b']['stage1_count']
+        return response + f"\n\nYou've found the {category.name} drawing, only {remaining} more—right? I think so!"
+    if outcome == DrawingOutcome.STAGE1_COMPLETE:
+        return response + "\n\nAll five drawings? Wowza! You did it! PIN time—uh, where did I put it again?"
+    if outcome == DrawingOutcome.DUPLICATE:
+        return response + f"\n\nHeyyy, déjà blue! You’ve drawn {category.name} before—try something new!"
+    if outcome == DrawingOutcome.ALREADY_PINNED:
+        return response + '\n\nPIN? Oh! I already gave you one! …I think. Maybe. Probably?'
+    if outcome == DrawingOutcome.STAGE2_COMPLETE:
+        return ''
+    return response
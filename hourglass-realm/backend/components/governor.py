@@ -0,0 +1,74 @@
+import asyncio, logging, time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+
+class GovernorBusy(Exception):
+    """Raised when the wait queue is already at its configured maximum depth"""
+
+
+class ConcurrencyGovernor:
+    """
+    Caps the number of in-flight calls sharing one backend (e.g. the LLM) and
+    keeps track of how many callers are queued and how long they waited
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int = 0, warn_wait: float = 2.0):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max_queue  # 0 means unbounded
+        self.warn_wait = warn_wait
+        self._semaphore = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.total_calls = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None):
+        """Hold one of `limit` slots; waiting longer than `timeout` seconds raises asyncio.TimeoutError"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        if self.max_queue and self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise GovernorBusy(f'{self.name}: {self.waiting} calls already queued')
+
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout)
+        finally:
+            self.waiting -= 1
+        wait = time.perf_counter() - start
+        self.total_calls += 1
+        self.total_wait += wait
+        self.last_wait = wait
+        self.max_wait = max(self.max_wait, wait)
+        if wait > self.warn_wait:
+            logging.warning(f'{self.name}: waited {wait:.2f}s for a slot ({self.waiting} still queued, {self.in_flight} in flight)')
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    @property
+    def has_free_slot(self) -> bool:
+        return self.in_flight < self.limit and not self.waiting
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'limit': self.limit,
+            'in_flight': self.in_flight,
+            'queue_depth': self.waiting,
+            'total_calls': self.total_calls,
+            'rejected': self.rejected,
+            'avg_wait_seconds': round(self.total_wait / self.total_calls, 4) if self.total_calls else 0.0,
+            'max_wait_seconds': round(self.max_wait, 4),
+            'last_wait_seconds': round(self.last_wait, 4),
+        }
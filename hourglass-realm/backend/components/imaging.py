@@ -0,0 +1,182 @@
+import base64, hashlib, io, os, re
+import numpy as np
+from dataclasses import dataclass, field
+from functools import cached_property
+from PIL import Image
+from typing import Any, Dict, Optional, Tuple
+
+
+DATA_URL_PATTERN = re.compile(r'data:image/(\w+);base64,(.+)', re.DOTALL)
+
+NORMALIZE_ENABLED = os.getenv('NORMALIZE_ENABLED', 'true').lower() == 'true'
+NORMALIZE_MAX_SIDE = int(os.getenv('NORMALIZE_MAX_SIDE', '256'))
+NORMALIZE_MARGIN = int(os.getenv('NORMALIZE_MARGIN', '8'))
+NORMALIZE_MODE = os.getenv('NORMALIZE_MODE', 'gray')  # gray | palette
+# The portal canvas is 300x300; anything far bigger is rejected from its header, before it is decoded
+MAX_DRAWING_PIXELS = int(os.getenv('MAX_DRAWING_PIXELS', str(2048 * 2048)))
+
+
+class DrawingTooLarge(ValueError):
+    """The image has more pixels than MAX_DRAWING_PIXELS"""
+
+
+def decode_data_url(data_url: str) -> Tuple[str, bytes]:
+    """Split a `data:image/<fmt>;base64,...` URL into its format and raw bytes"""
+    match = DATA_URL_PATTERN.match(data_url)
+    if not match:
+        raise ValueError('image_data is not a base64 image data URL')
+    image_format, base64_string = match.groups()
+    return image_format.lower(), base64.b64decode(base64_string)
+
+
+def load_image(image_bytes: bytes) -> Tuple[str, np.ndarray]:
+    """Decode an encoded image, returning its detected format and RGB pixels"""
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        if img.width * img.height > MAX_DRAWING_PIXELS:
+            raise DrawingTooLarge(f'Drawing is too large: {img.width}x{img.height} pixels')
+        return (img.format or 'png').lower(), np.asarray(img.convert('RGB'))
+
+
+def pixel_digest(pixels: np.ndarray) -> str:
+    """Exact content digest of the decoded pixels, independent of how the image was encoded"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(pixels.shape).encode())
+    h.update(np.ascontiguousarray(pixels).tobytes())
+    return h.hexdigest()
+
+
+def difference_hash(pixels: np.ndarray, size: int = 8) -> int:
+    """Perceptual dHash (size*size bits): compares neighbouring cells of a small grayscale thumbnail"""
+    gray = Image.fromarray(pixels).convert('L').resize((size + 1, size), Image.Resampling.BILINEAR)
+    cells = np.asarray(gray, dtype=np.int16)
+    bits = (cells[:, 1:] > cells[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def ink_hash(pixels: np.ndarray, bbox: Optional[Tuple[int, int, int, int]], size: int = 16) -> int:
+    """dHash of the ink's bounding box squared up around its centre, so position and scale on the canvas do not count"""
+    if bbox is not None:
+        x0, y0, x1, y1 = bbox
+        side = max(x1 - x0, y1 - y0)
+        border = np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]])
+        square = Image.new('RGB', (side, side), tuple(int(c) for c in np.median(border, axis=0)))
+        square.paste(Image.fromarray(pixels).crop(bbox), ((side - (x1 - x0)) // 2, (side - (y1 - y0)) // 2))
+        pixels = np.asarray(square)
+    return difference_hash(pixels, size)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def ink_mask(pixels: np.ndarray, tolerance: int = 40) -> np.ndarray:
+    """Boolean mask of pixels that differ from the background, estimated as the median border colour"""
+    border = np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]])
+    background = np.median(border, axis=0).astype(np.int16)
+    return (np.abs(pixels.astype(np.int16) - background).max(axis=2) > tolerance)
+
+
+def count_strokes(mask: np.ndarray, grid: int = 64) -> int:
+    """Number of 8-connected ink blobs after max-pooling the mask onto a coarse grid"""
+    h, w = mask.shape
+    rows = np.linspace(0, h, min(grid, h) + 1, dtype=int)
+    cols = np.linspace(0, w, min(grid, w) + 1, dtype=int)
+    pooled = np.logical_or.reduceat(np.logical_or.reduceat(mask, rows[:-1], axis=0), cols[:-1], axis=1)
+
+    remaining = set(zip(*np.nonzero(pooled)))
+    strokes = 0
+    while remaining:
+        strokes += 1
+        frontier = [remaining.pop()]
+        while frontier:
+            r, c = frontier.pop()
+            for dr in (-1, 0, 1):
+                for dc in (-1, 0, 1):
+                    neighbour = (r + dr, c + dc)
+                    if neighbour in remaining:
+                        remaining.remove(neighbour)
+                        frontier.append(neighbour)
+    return strokes
+
+
+def ink_stats(pixels: np.ndarray) -> Dict[str, Any]:
+    """Coverage, bounding box and stroke count of the ink in a drawing"""
+    mask = ink_mask(pixels)
+    h, w = mask.shape
+    ink_pixels = int(mask.sum())
+    if ink_pixels == 0:
+        return {'coverage': 0.0, 'bbox': None, 'extent': 0.0, 'aspect': 0.0, 'strokes': 0}
+    ys = np.flatnonzero(mask.any(axis=1))
+    xs = np.flatnonzero(mask.any(axis=0))
+    bbox = (int(xs[0]), int(ys[0]), int(xs[-1]) + 1, int(ys[-1]) + 1)
+    bw, bh = bbox[2] - bbox[0], bbox[3] - bbox[1]
+    return {
+        'coverage': ink_pixels / mask.size,
+        'bbox': bbox,
+        'extent': max(bw / w, bh / h),
+        'aspect': min(bw, bh) / max(bw, bh),
+        'strokes': count_strokes(mask),
+    }
+
+
+def normalize_pixels(pixels: np.ndarray, bbox: Optional[Tuple[int, int, int, int]]) -> bytes:
+    """Crop to the ink bounding box, cap the longest side, reduce colours and re-encode as a compact PNG"""
+    img = Image.fromarray(pixels)
+    if bbox is not None:
+        x0, y0, x1, y1 = bbox
+        img = img.crop((
+            max(0, x0 - NORMALIZE_MARGIN), max(0, y0 - NORMALIZE_MARGIN),
+            min(img.width, x1 + NORMALIZE_MARGIN), min(img.height, y1 + NORMALIZE_MARGIN),
+        ))
+    if max(img.size) > NORMALIZE_MAX_SIDE:
+        img.thumbnail((NORMALIZE_MAX_SIDE, NORMALIZE_MAX_SIDE), Image.Resampling.LANCZOS)
+    if NORMALIZE_MODE == 'palette':
+        img = img.quantize(colors=16)
+    else:
+        img = img.convert('L')
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+@dataclass
+class Drawing:
+    """A submitted drawing, decoded once and shared by the local checks, the model call and the archive"""
+    raw_format: str
+    raw_bytes: bytes = field(repr=False)
+    pixels: np.ndarray = field(repr=False)
+    stats: Dict[str, Any]
+    normalized_bytes: bytes = field(repr=False)
+    normalized_format: str
+    answered_by: Optional[str] = None  # 'prefilter', 'cache' or 'model', once the chatbot pipeline has answered it
+
+    @cached_property
+    def digest(self) -> str:
+        return pixel_digest(self.pixels)
+
+    @property
+    def data_url(self) -> str:
+        return f'data:image/{self.normalized_format};base64,' + base64.b64encode(self.normalized_bytes).decode('ascii')
+
+
+def prepare_drawing(image_data: str) -> Drawing:
+    """Decode a data URL, analyse its ink and build the normalized image. Raises ValueError if undecodable"""
+    image_format, image_bytes = decode_data_url(image_data)
+    return prepare_drawing_bytes(image_bytes, image_format)
+
+
+def prepare_drawing_bytes(image_bytes: bytes, image_format: Optional[str] = None) -> Drawing:
+    """Same as prepare_drawing for an already-binary upload; the format is sniffed if not given"""
+    try:
+        detected_format, pixels = load_image(image_bytes)
+    except DrawingTooLarge:
+        raise
+    except Image.DecompressionBombError as e:
+        raise DrawingTooLarge(str(e))
+    except Exception as e:
+        raise ValueError(f'image could not be decoded: {e}')
+    image_format = image_format or detected_format
+    stats = ink_stats(pixels)
+    if NORMALIZE_ENABLED:
+        return Drawing(image_format, image_bytes, pixels, stats, normalize_pixels(pixels, stats['bbox']), 'png')
+    return Drawing(image_format, image_bytes, pixels, stats, image_bytes, image_format)
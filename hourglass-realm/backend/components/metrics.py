@@ -0,0 +1,192 @@
+import contextvars, logging, os, threading, time
+from contextlib import contextmanager
+from fastapi import Request, Response
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'false').lower() == 'true'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TOKEN_BUCKETS = (32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+# Spans finished during the current request, for the Server-Timing header
+_request_spans: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar('request_spans', default=None)
+
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: str = '') -> str:
+    def escape(v: Any) -> str:
+        return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    parts = [f'{n}="{escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _number(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+# ============== Metric Types ==============
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *labels: Any, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.label_names, labels)} {_number(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List] = {}  # labels -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *labels: Any):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    le = 'le="%s"' % _number(bound)
+                    lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}')
+                le = 'le="+Inf"'
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, labels, le)} {count}')
+                lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {_number(round(total, 6))}')
+                lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {count}')
+        return lines
+
+
+class StatsCollector:
+    """Exposes an existing stats() dict (governor, caches, counters) as untyped samples, one per numeric key"""
+
+    def __init__(self, prefix: str, stats: Callable[[], Dict[str, Any]]):
+        self.prefix, self.stats = prefix, stats
+        REGISTRY.append(self)
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, value in self.stats().items():
+            if isinstance(value, (int, float)):  # bools included
+                name = f'{self.prefix}_{key}'
+                lines += [f'# TYPE {name} untyped', f'{name} {_number(value)}']
+        return lines
+
+
+REGISTRY: List[Any] = []
+
+HTTP_SECONDS = Histogram('hourglass_http_request_seconds', 'Request latency until the response starts', ['method', 'route', 'status'])
+SPAN_SECONDS = Histogram('hourglass_span_seconds', 'Time spent in hot-path stages', ['span'])
+LLM_CALLS = Counter('hourglass_llm_calls_total', 'Model calls by stage and result', ['stage', 'result'])
+LLM_TOKENS = Counter('hourglass_llm_tokens_total', 'Model tokens by stage and direction', ['stage', 'kind'])
+LLM_FIRST_TEXT_SECONDS = Histogram('hourglass_llm_first_text_seconds', 'Time from a streamed model call to the first reply text it produced', ['stage'])
+LLM_CALL_TOKENS = Histogram('hourglass_llm_call_tokens', 'Tokens of a single model call by stage and direction', ['stage', 'kind'], buckets=TOKEN_BUCKETS)
+LLM_HEDGES = Counter('hourglass_llm_hedges_total', 'Hedged model calls: fired, won by the hedge, or skipped for lack of a free slot', ['outcome'])
+LLM_FALLBACKS = Counter('hourglass_llm_fallbacks_total', 'Drawings answered with the fallback reply', ['reason'])
+BREAKER_TRANSITIONS = Counter('hourglass_circuit_breaker_transitions_total', 'Circuit breaker state changes', ['breaker', 'state'])
+STATE_CONFLICTS = Counter('hourglass_state_conflicts_total', 'Conditional state updates that lost a race', ['room'])
+
+
+def register_stats(prefix: str, stats: Callable[[], Dict[str, Any]]):
+    StatsCollector(prefix, stats)
+
+
+def render() -> str:
+    return '\n'.join(line for metric in REGISTRY for line in metric.render()) + '\n'
+
+
+def metrics_response() -> Response:
+    return Response(render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# ============== Spans ==============
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a hot-path stage into hourglass_span_seconds and the current request's Server-Timing"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        SPAN_SECONDS.observe(elapsed, name)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((name, elapsed))
+
+
+def llm_usage_counts(usage: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    """input/output tokens of one call, plus the input read from a context cache and the output spent thinking"""
+    if not usage:
+        return {}
+    counts = {
+        'input': usage.get('input_tokens'),
+        'output': usage.get('output_tokens'),
+        'cached': (usage.get('input_token_details') or {}).get('cache_read', usage.get('cached_tokens')),
+        'reasoning': (usage.get('output_token_details') or {}).get('reasoning'),
+    }
+    return {kind: int(n) for kind, n in counts.items() if n}
+
+
+def record_llm_usage(stage: int, usage: Optional[Dict[str, Any]]):
+    counts = llm_usage_counts(usage)
+    for kind, n in counts.items():
+        LLM_TOKENS.inc(stage, kind, amount=n)
+    for kind in ('input', 'output'):
+        if kind in counts:
+            LLM_CALL_TOKENS.observe(counts[kind], stage, kind)
+    if counts:
+        logging.debug(f'Model call for stage {stage}: {counts}')
+
+
+def server_timing(spans: List[Tuple[str, float]], total: float) -> str:
+    durations: Dict[str, float] = {}
+    for name, elapsed in spans:
+        durations[name] = durations.get(name, 0.0) + elapsed
+    entries = [f'{name};dur={elapsed * 1000:.1f}' for name, elapsed in durations.items()]
+    return ', '.join(entries + [f'total;dur={total * 1000:.1f}'])
+
+
+async def timing_middleware(request: Request, call_next):
+    """Request latency by route template, plus a Server-Timing header when SERVER_TIMING_ENABLED"""
+    spans: List[Tuple[str, float]] = []
+    token = _request_spans.set(spans)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - start
+        _request_spans.reset(token)
+        route = request.scope.get('route')
+        HTTP_SECONDS.observe(elapsed, request.method, getattr(route, 'path', 'unmatched'), status)
+    if SERVER_TIMING_ENABLED:
+        response.headers['Server-Timing'] = server_timing(spans, elapsed)
+        response.headers['Timing-Allow-Origin'] = '*'
+    return response
@@ -0,0 +1,124 @@
+import asyncio, logging, threading, time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class CircuitBreaker:
+    """
+    Stops calling a degraded backend: after failure_threshold consecutive failures the circuit opens and
+    allow() refuses calls for reset_timeout seconds, then one trial call is let through (half-open).
+    Its success closes the circuit again, its failure reopens it.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0, on_transition: Optional[Callable[[str, str], None]] = None):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.on_transition = on_transition  # (breaker name, new state)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.rejected = 0
+        self.transitions: Dict[str, int] = {self.CLOSED: 0, self.OPEN: 0, self.HALF_OPEN: 0}
+
+    def _move(self, state: str):
+        self._state = state
+        self.transitions[state] += 1
+        if state == self.OPEN:
+            self._opened_at = time.monotonic()
+            logging.warning(f'{self.name}: circuit opened after {self.failures} consecutive failures')
+        else:
+            logging.info(f'{self.name}: circuit {state}')
+        if self.on_transition:
+            self.on_transition(self.name, state)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._move(self.HALF_OPEN)
+            return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        with self._lock:
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def abandon(self):
+        """An allowed call that never reached the backend; frees the half-open trial"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_in_flight = False
+            if self._state != self.CLOSED:
+                self._move(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            trial, self._trial_in_flight = self._trial_in_flight, False
+            if self._state == self.HALF_OPEN and trial or self._state == self.CLOSED and self.failures >= self.failure_threshold:
+                self._move(self.OPEN)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'rejected': self.rejected,
+            **{f'to_{state}': n for state, n in self.transitions.items()},
+        }
+
+
+class LatencyWindow:
+    """The most recent `size` latencies of successful calls, for percentile-based delays"""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self._samples: deque = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """None until min_samples latencies have been seen"""
+        samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+async def hedged(call: Callable[[], Awaitable[Any]], hedge_after: Optional[float], can_hedge: Callable[[], bool] = lambda: True) -> Tuple[Any, int]:
+    """
+    Await call(); if it has not finished after hedge_after seconds (None never hedges) and can_hedge(),
+    start a second identical call and take whichever succeeds first. The loser is cancelled.
+    Returns (result, index of the winning call); raises the first call's exception if all of them fail.
+    """
+    tasks = [asyncio.ensure_future(call())]
+    try:
+        if hedge_after is not None:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done and can_hedge():
+                tasks.append(asyncio.ensure_future(call()))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), tasks.index(task)
+        raise tasks[0].exception()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,21 @@
+import os, re
+from fastapi import HTTPException
+from typing import List, Optional
+
+
+DEFAULT_ROOM_ID = os.getenv('DEFAULT_ROOM_ID', 'default')
+ROOM_ID_PATTERN = re.compile(r'^[a-z0-9][a-z0-9-]{0,31}$')
+
+
+def validate_room_id(room_id: Optional[str]) -> str:
+    """Normalize a room ID from a request, falling back to the default room"""
+    room_id = (room_id or DEFAULT_ROOM_ID).strip().lower()
+    if not ROOM_ID_PATTERN.match(room_id):
+        raise HTTPException(status_code=400, detail='Invalid room ID')
+    return room_id
+
+
+def startup_room_ids() -> List[str]:
+    """Rooms created at startup: the default room plus any listed in ROOM_IDS (comma-separated)"""
+    extra = [r for r in os.getenv('ROOM_IDS', '').split(',') if r.strip()]
+    return list(dict.fromkeys(validate_room_id(r) for r in [DEFAULT_ROOM_ID, *extra]))
@@ -7,6 +7,9 @@ class UnlockReq(BaseModel):
 class ChatbotReq(BaseModel):
     image_data: str
 
+class ChatbotBatchReq(BaseModel):
+    images: List[str]
+
 class SetTimeReq(BaseModel):
     minutes_from_now: int
 
@@ -0,0 +1,148 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class FlightLimitReached(Exception):
+    """Raised when a group already has its maximum number of distinct calls in flight"""
+
+
+async def _collect(items: AsyncIterator[Any]) -> List[Any]:
+    return [item async for item in items]
+
+
+async def _single(result: Awaitable[Any]) -> AsyncIterator[Any]:
+    yield await result
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same (group, key) onto one execution: callers arriving while it
+    runs wait for the same result (or exception) instead of starting new work.
+    Each group (e.g. a session) may have at most max_per_group distinct keys in flight; 0 means no cap.
+    The work runs as its own task, so a caller that goes away does not cancel it for the others.
+    run() and stream() callers may share keys: a caller joining the other kind of flight converts its outcome
+    with `from_items` / `from_result`.
+    Per process only; replicas do not see each other's flights.
+    """
+
+    def __init__(self, name: str, max_per_group: int = 0):
+        self.name = name
+        self.max_per_group = max_per_group
+        self._flights: Dict[Tuple[Hashable, Hashable], asyncio.Future] = {}
+        self._per_group: Dict[Hashable, int] = {}
+        self._logs: Dict[Tuple[Hashable, Hashable], '_ItemLog'] = {}
+        self.started = 0
+        self.joined = 0
+        self.limited = 0
+
+    async def run(self, group: Hashable, key: Hashable, work: Callable[[], Awaitable[Any]],
+                  from_items: Callable[[AsyncIterator[Any]], Awaitable[Any]] = _collect) -> Any:
+        """work()'s result; joining a stream() flight, from_items(its items) (by default, the list of them)"""
+        flight_key = (group, key)
+        flight = self._flights.get(flight_key)
+        if flight is not None:
+            self.joined += 1
+            log = self._logs.get(flight_key)
+            if log is not None:
+                return await from_items(log.follow())
+            return await asyncio.shield(flight)
+        return await asyncio.shield(self._start(group, flight_key, work))
+
+    def stream(self, group: Hashable, key: Hashable, work: Callable[[], AsyncIterator[Any]],
+               from_result: Callable[[Awaitable[Any]], AsyncIterator[Any]] = _single) -> AsyncIterator[Any]:
+        """
+        run() for a producer of items: every caller gets all the items of the one execution, joiners from the first.
+        Joining a run() flight gives from_result(its result) (by default, the result as the only item).
+        Raises FlightLimitReached right away rather than from the iterator
+        """
+        flight_key = (group, key)
+        log = self._logs.get(flight_key)
+        if log is not None:
+            self.joined += 1
+            return log.follow()
+        flight = self._flights.get(flight_key)
+        if flight is not None:
+            self.joined += 1
+            return from_result(asyncio.shield(flight))
+        log = _ItemLog()
+
+        async def drain():
+            try:
+                async for item in work():
+                    log.append(item)
+            except BaseException as e:
+                log.close(e)
+                raise
+            log.close()
+
+        self._start(group, flight_key, drain)
+        self._logs[flight_key] = log
+        return log.follow()
+
+    def _start(self, group: Hashable, flight_key: Tuple[Hashable, Hashable], work: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        if self.max_per_group and self._per_group.get(group, 0) >= self.max_per_group:
+            self.limited += 1
+            raise FlightLimitReached(f'{self.name}: {self._per_group.get(group, 0)} calls already in flight')
+
+        flight = asyncio.ensure_future(work())
+        self._flights[flight_key] = flight
+        self._per_group[group] = self._per_group.get(group, 0) + 1
+        self.started += 1
+
+        def land(done: asyncio.Future):
+            del self._flights[flight_key]
+            self._logs.pop(flight_key, None)
+            remaining = self._per_group[group] - 1
+            if remaining:
+                self._per_group[group] = remaining
+            else:
+                del self._per_group[group]
+            if not done.cancelled():
+                done.exception()  # retrieved here so an unawaited failure is not logged as never retrieved
+
+        flight.add_done_callback(land)
+        return flight
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'in_flight': len(self._flights),
+            'groups_in_flight': len(self._per_group),
+            'max_per_group': self.max_per_group,
+            'started': self.started,
+            'joined': self.joined,
+            'limited': self.limited,
+        }
+
+
+class _ItemLog:
+    """Items of one streamed flight, kept until it lands so that every follower can replay them from the start"""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.closed = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def append(self, item: Any):
+        self.items.append(item)
+        self._wake()
+
+    def close(self, error: Optional[BaseException] = None):
+        self.closed, self.error = True, error
+        self._wake()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[Any]:
+        i = 0
+        while True:
+            while i < len(self.items):
+                yield self.items[i]
+                i += 1
+            if self.closed:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
@@ -0,0 +1,98 @@
+import contextlib, contextvars, threading, time
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+
+_request_memo: contextvars.ContextVar[Optional[Dict[str, Dict[str, Any]]]] = contextvars.ContextVar('state_request_memo', default=None)
+
+
+class StateCache:
+    """
+    Read-through cache in front of the game state store.
+    Each request memoizes the rooms it has read; across requests a process-wide copy per room is served
+    for `ttl` seconds and then revalidated with a cheap (version, created_at) read before the full item is fetched again.
+    Own writes replace the cached copy, so a process always sees at least what it wrote itself.
+    Cached items are shared, callers must treat them as read-only.
+    """
+
+    def __init__(self, load: Callable[[str], Dict[str, Any]], load_stamp: Callable[[str], Tuple[Any, Any]], ttl: float = 2.0):
+        self.load = load                  # room_id -> full item, raises if the room is missing
+        self.load_stamp = load_stamp      # room_id -> (version, created_at) via a cheap read, raises if the room is missing
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[Dict[str, Any], float]] = {}
+        self._lock = threading.Lock()
+        self.memo_hits = 0
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self.stores = 0
+
+    @contextlib.contextmanager
+    def request_scope(self) -> Iterator[None]:
+        token = _request_memo.set({})
+        try:
+            yield
+        finally:
+            _request_memo.reset(token)
+
+    def _remember(self, room_id: str, item: Dict[str, Any]):
+        memo = _request_memo.get()
+        if memo is not None:
+            memo[room_id] = item
+
+    def get(self, room_id: str, fresh: bool = False) -> Dict[str, Any]:
+        """The room's state; `fresh` skips both caches, e.g. to re-plan after a lost conditional update"""
+        memo = _request_memo.get()
+        if not fresh:
+            if memo is not None and room_id in memo:
+                self.memo_hits += 1
+                return memo[room_id]
+            with self._lock:
+                cached = self._entries.get(room_id)
+            if cached is not None:
+                item, fetched_at = cached
+                if time.monotonic() - fetched_at < self.ttl:
+                    self.hits += 1
+                    self._remember(room_id, item)
+                    return item
+                if self.load_stamp(room_id) == (item.get('version'), item.get('created_at')):
+                    self.revalidations += 1
+                    with self._lock:
+                        self._entries[room_id] = (item, time.monotonic())
+                    self._remember(room_id, item)
+                    return item
+        self.misses += 1
+        item = self.load(room_id)
+        self.store(room_id, item)
+        return item
+
+    def store(self, room_id: str, item: Dict[str, Any]):
+        """Record an item read or written by this process; an older version of the same game never replaces a newer one"""
+        with self._lock:
+            cached = self._entries.get(room_id)
+            if (cached is not None and cached[0].get('created_at') == item.get('created_at')
+                    and cached[0].get('version', 0) > item.get('version', 0)):
+                return
+            if self.ttl > 0:
+                self._entries[room_id] = (item, time.monotonic())
+            self.stores += 1
+        self._remember(room_id, item)
+
+    def invalidate(self, room_id: str):
+        with self._lock:
+            self._entries.pop(room_id, None)
+        memo = _request_memo.get()
+        if memo is not None:
+            memo.pop(room_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        reads = self.memo_hits + self.hits + self.revalidations + self.misses
+        return {
+            'rooms': len(self._entries),
+            'ttl': self.ttl,
+            'memo_hits': self.memo_hits,
+            'hits': self.hits,
+            'revalidations': self.revalidations,
+            'misses': self.misses,
+            'stores': self.stores,
+            'hit_rate': round((reads - self.misses) / reads, 4) if reads else 0.0,
+        }
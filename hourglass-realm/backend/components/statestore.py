@@ -0,0 +1,372 @@
+import contextlib, copy, json, logging, os, sqlite3, threading, time
+from datetime import datetime, timezone
+from typing import Any, ContextManager, Dict, Iterable, List, Optional, Set, Tuple
+
+from components.updates import StateUpdate
+
+
+class RoomNotFound(KeyError):
+    pass
+
+
+class StateStore:
+    """
+    Where the game state of each room lives. Stores hand out whole-state snapshots that callers treat
+    as read-only; every write goes through update() (a conditional StateUpdate that also bumps `version`)
+    or create(). `shared` stores can be written by other processes too, so /events has to poll them.
+    """
+    name = 'base'
+    shared = False
+
+    def get(self, room_id: str, fresh: bool = False) -> Optional[Dict[str, Any]]:
+        """The room's state or None; `fresh` bypasses any read cache, e.g. to re-plan after a lost update"""
+        raise NotImplementedError
+
+    def stamp(self, room_id: str) -> Optional[Tuple[Any, Any]]:
+        """(version, created_at) of the room, as cheaply as the backend allows"""
+        state = self.get(room_id, fresh=True)
+        return (state['version'], state['created_at']) if state is not None else None
+
+    def existing(self, room_ids: Iterable[str]) -> Set[str]:
+        return {room_id for room_id in room_ids if self.get(room_id) is not None}
+
+    def create(self, room_id: str, state: Dict[str, Any], replace: bool = False) -> bool:
+        """Store a fresh room state; unless replace, only if the room does not exist yet"""
+        raise NotImplementedError
+
+    def update(self, room_id: str, update: StateUpdate) -> Optional[Dict[str, Any]]:
+        """Apply the update and return the new state; None if the room is missing or a condition fails"""
+        raise NotImplementedError
+
+    def rooms(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """(room_id, state) for every room; the state may be limited to the fields of a room summary"""
+        raise NotImplementedError
+
+    def request_scope(self) -> ContextManager:
+        """Wraps each HTTP request, for stores that memoize reads per request"""
+        return contextlib.nullcontext()
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': self.name}
+
+
+def _applied(current: Dict[str, Any], update: StateUpdate) -> Optional[Dict[str, Any]]:
+    """A new state with the update applied and the version bumped, or None if a condition fails"""
+    state = copy.deepcopy(current)
+    if not update.apply(state):
+        return None
+    state['version'] = current['version'] + 1
+    state['updated_at'] = datetime.now(timezone.utc).isoformat()
+    return state
+
+
+# ============== Memory ==============
+
+class MemoryStateStore(StateStore):
+    """Game state per room in this process only; lost on restart"""
+    name = 'memory'
+
+    def __init__(self):
+        self._rooms: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.conflicts = 0
+
+    def get(self, room_id: str, fresh: bool = False) -> Optional[Dict[str, Any]]:
+        return self._rooms.get(room_id)
+
+    def create(self, room_id: str, state: Dict[str, Any], replace: bool = False) -> bool:
+        with self._lock:
+            if not replace and room_id in self._rooms:
+                return False
+            self._rooms[room_id] = state
+        self._written(room_id, state)
+        return True
+
+    def update(self, room_id: str, update: StateUpdate) -> Optional[Dict[str, Any]]:
+        # Applied to a copy that is swapped in, so states already handed out never change
+        with self._lock:
+            current = self._rooms.get(room_id)
+            if current is None:
+                return None
+            state = _applied(current, update)
+            if state is None:
+                self.conflicts += 1
+                return None
+            self._rooms[room_id] = state
+            self.updates += 1
+        self._written(room_id, state)
+        return state
+
+    def _written(self, room_id: str, state: Dict[str, Any]):
+        pass
+
+    def rooms(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return sorted(self._rooms.items())
+
+    def stats(self) -> Dict[str, Any]:
+        return {'backend': self.name, 'rooms': len(self._rooms), 'updates': self.updates, 'conflicts': self.conflicts}
+
+
+# ============== Journal ==============
+
+class JournalStateStore(MemoryStateStore):
+    """
+    Memory store that survives restarts. Each written state is appended to journal.jsonl behind the request:
+    a flusher thread writes every flush_interval seconds, keeping only the latest state of a room written
+    several times in between, and fsyncs once per batch. After snapshot_every journal lines all rooms are
+    written to snapshot.json (atomically replaced) and the journal starts over. Startup loads the snapshot
+    and replays the journal; a write is lost only if the process dies within flush_interval of it.
+    flush_interval 0 writes through on every update instead.
+    """
+    name = 'journal'
+
+    def __init__(self, directory: str, flush_interval: float = 0.2, snapshot_every: int = 1000):
+        super().__init__()
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.snapshot_every = max(1, snapshot_every)
+        self.snapshot_path = os.path.join(directory, 'snapshot.json')
+        self.journal_path = os.path.join(directory, 'journal.jsonl')
+        self._dirty: Dict[str, Dict[str, Any]] = {}  # room -> latest state not journaled yet
+        self._io_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._journal_lines = 0
+        self.flushes = 0
+        self.lines_written = 0
+        self.coalesced = 0
+        self.snapshots = 0
+        os.makedirs(directory, exist_ok=True)
+        self.recovery_seconds, self.recovered_lines = self._recover()
+
+    def _recover(self) -> Tuple[float, int]:
+        start = time.perf_counter()
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                self._rooms = json.load(f)['rooms']
+        lines = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'rb+') as f:
+                good = 0
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A write cut short by a crash; cut it off so the next append starts on a fresh line
+                        logging.warning(f'Dropping a torn line at the end of {self.journal_path}')
+                        f.truncate(good)
+                        break
+                    self._rooms[record['room']] = record['state']
+                    good += len(line)
+                    lines += 1
+        self._journal_lines = lines
+        elapsed = time.perf_counter() - start
+        if self._rooms:
+            logging.info(f'Recovered {len(self._rooms)} rooms from {self.directory} ({lines} journal lines) in {elapsed * 1000:.1f}ms')
+        return elapsed, lines
+
+    def _written(self, room_id: str, state: Dict[str, Any]):
+        with self._lock:
+            if room_id in self._dirty:
+                self.coalesced += 1
+            self._dirty[room_id] = state
+        if self.flush_interval <= 0 or self._flusher is None:
+            self.flush()
+
+    def flush(self):
+        """Append the pending states to the journal, then snapshot if the journal has grown long enough"""
+        with self._io_lock:
+            with self._lock:
+                pending, self._dirty = self._dirty, {}
+            if pending:
+                with open(self.journal_path, 'a', encoding='utf-8') as f:
+                    f.write(''.join(json.dumps({'room': r, 'state': s}, default=str) + '\n' for r, s in pending.items()))
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.flushes += 1
+                self.lines_written += len(pending)
+                self._journal_lines += len(pending)
+            if self._journal_lines >= self.snapshot_every:
+                self._snapshot()
+
+    def _snapshot(self):
+        # Everything journaled so far is already in _rooms, so the journal can start over once this is in place
+        with self._lock:
+            rooms = dict(self._rooms)
+        tmp = self.snapshot_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'rooms': rooms}, f, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        open(self.journal_path, 'w').close()
+        self._journal_lines = 0
+        self.snapshots += 1
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f'Journal flush to {self.journal_path} failed: {e}')
+
+    def start(self):
+        if self.flush_interval > 0 and self._flusher is None:
+            self._flusher = threading.Thread(target=self._run, name='state-journal', daemon=True)
+            self._flusher.start()
+
+    def close(self):
+        if self._flusher is not None:
+            self._stopped.set()
+            self._wake.set()
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
+        with self._io_lock:
+            self._snapshot()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            'directory': self.directory,
+            'pending': len(self._dirty),
+            'flushes': self.flushes,
+            'lines_written': self.lines_written,
+            'coalesced': self.coalesced,
+            'journal_lines': self._journal_lines,
+            'snapshots': self.snapshots,
+            'recovered_lines': self.recovered_lines,
+            'recovery_ms': round(self.recovery_seconds * 1000, 2),
+        }
+
+
+# ============== SQLite ==============
+
+class SQLiteStateStore(StateStore):
+    """
+    Game state per room in one SQLite database in WAL mode, shared by every uvicorn worker on the host.
+    Writers compare-and-set on (version, created_at): a row changed by another worker since it was read
+    is re-read and the update re-applied, so conditions are always checked against the latest state.
+    """
+    name = 'sqlite'
+    shared = True
+
+    def __init__(self, path: str, max_attempts: int = 20):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self.updates = 0
+        self.conflicts = 0
+        self.cas_retries = 0
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS rooms ('
+                'room_id TEXT PRIMARY KEY, version INTEGER NOT NULL, created_at TEXT NOT NULL, state TEXT NOT NULL)'
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; autocommit, so every statement is its own transaction"""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10.0, isolation_level=None, check_same_thread=False)
+            db.execute('PRAGMA synchronous=NORMAL')  # durable at WAL checkpoints, enough for one night's game
+            db.execute('PRAGMA busy_timeout=10000')
+            self._local.db = db
+        return db
+
+    def get(self, room_id: str, fresh: bool = False) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute('SELECT state FROM rooms WHERE room_id = ?', (room_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def stamp(self, room_id: str) -> Optional[Tuple[int, str]]:
+        row = self._connect().execute('SELECT version, created_at FROM rooms WHERE room_id = ?', (room_id,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def existing(self, room_ids: Iterable[str]) -> Set[str]:
+        room_ids = list(room_ids)
+        marks = ', '.join('?' * len(room_ids))
+        return {row[0] for row in self._connect().execute(f'SELECT room_id FROM rooms WHERE room_id IN ({marks})', room_ids)}
+
+    def create(self, room_id: str, state: Dict[str, Any], replace: bool = False) -> bool:
+        verb = 'INSERT OR REPLACE' if replace else 'INSERT OR IGNORE'
+        cursor = self._connect().execute(
+            f'{verb} INTO rooms (room_id, version, created_at, state) VALUES (?, ?, ?, ?)',
+            (room_id, state['version'], state['created_at'], json.dumps(state)),
+        )
+        return cursor.rowcount == 1
+
+    def update(self, room_id: str, update: StateUpdate) -> Optional[Dict[str, Any]]:
+        db = self._connect()
+        for attempt in range(self.max_attempts):
+            current = self.get(room_id)
+            if current is None:
+                return None
+            state = _applied(current, update)
+            if state is None:
+                self.conflicts += 1
+                return None
+            cursor = db.execute(
+                'UPDATE rooms SET version = ?, state = ? WHERE room_id = ? AND version = ? AND created_at = ?',
+                (state['version'], json.dumps(state), room_id, current['version'], current['created_at']),
+            )
+            if cursor.rowcount == 1:
+                self.updates += 1
+                return state
+            self.cas_retries += 1
+        logging.warning(f'Room {room_id}: gave up after {self.max_attempts} compare-and-set attempts')
+        self.conflicts += 1
+        return None
+
+    def rooms(self) -> List[Tuple[str, Dict[str, Any]]]:
+        return [(room_id, json.loads(state)) for room_id, state in self._connect().execute('SELECT room_id, state FROM rooms ORDER BY room_id')]
+
+    def stats(self) -> Dict[str, Any]:
+        rooms = self._connect().execute('SELECT COUNT(*) FROM rooms').fetchone()[0]
+        return {
+            'backend': self.name,
+            'path': self.path,
+            'rooms': rooms,
+            'updates': self.updates,
+            'conflicts': self.conflicts,
+            'cas_retries': self.cas_retries,
+        }
+
+
+# ============== Configuration ==============
+
+STATE_STORES = ('memory', 'journal', 'sqlite', 'dynamodb')
+
+def open_state_store(default: str = 'memory') -> StateStore:
+    """
+    The store named by STATE_STORE: memory (one process, lost on restart), journal (one process,
+    recovered from STATE_JOURNAL_DIR), sqlite (STATE_SQLITE_PATH, shared by local workers)
+    or dynamodb (DYNAMODB_TABLE_NAME, shared by every instance)
+    """
+    backend = os.getenv('STATE_STORE', default).lower()
+    if backend == 'memory':
+        return MemoryStateStore()
+    if backend == 'journal':
+        return JournalStateStore(
+            os.getenv('STATE_JOURNAL_DIR', 'state'),
+            flush_interval=float(os.getenv('STATE_JOURNAL_FLUSH_SECONDS', '0.2')),
+            snapshot_every=int(os.getenv('STATE_JOURNAL_SNAPSHOT_EVERY', '1000')),
+        )
+    if backend == 'sqlite':
+        return SQLiteStateStore(os.getenv('STATE_SQLITE_PATH', 'game_state.db'))
+    if backend == 'dynamodb':
+        from components.dynamostore import DynamoDBStateStore  # boto3 only where it is used
+        return DynamoDBStateStore(
+            os.getenv('DYNAMODB_TABLE_NAME', 'escape-room-001'),
+            cache_ttl=float(os.getenv('STATE_CACHE_TTL_SECONDS', '2')),
+        )
+    raise ValueError(f'Unknown STATE_STORE {backend!r}, expected one of {STATE_STORES}')
@@ -0,0 +1,46 @@
+import base64, functools, hashlib, hmac, logging, os, time
+from fastapi import HTTPException
+from typing import Tuple
+
+from components.rooms import ROOM_ID_PATTERN
+
+
+@functools.lru_cache(maxsize=1)
+def _secret() -> bytes:
+    """Read on first use so values loaded from .env after import are picked up"""
+    secret = os.getenv('SESSION_TOKEN_SECRET')
+    if secret:
+        return secret.encode()
+    # Every instance must share the key, so derive it from other shared config rather than randomly
+    logging.warning('SESSION_TOKEN_SECRET is not set, deriving the session token key from ADMIN_PASSPHRASE')
+    return hashlib.sha256(b'session-token:' + os.getenv('ADMIN_PASSPHRASE', 'changeme').encode()).digest()
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(_secret(), payload.encode(), hashlib.sha256).digest()[:16]
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+
+def new_session_epoch() -> int:
+    """Epoch stored on the room by /enter; tokens carrying an older epoch stop validating"""
+    return time.time_ns() // 1000
+
+
+def issue_session_token(room_id: str, epoch: int) -> str:
+    payload = f'{room_id}.{epoch}'
+    return f'{payload}.{_sign(payload)}'
+
+
+def verify_session_token(token: str) -> Tuple[str, int]:
+    """Check the signature locally, in constant time, and return (room_id, epoch). Raises 403 before any I/O"""
+    room_id, _, rest = token.partition('.')
+    epoch, _, signature = rest.partition('.')
+    if not (ROOM_ID_PATTERN.match(room_id) and epoch.isascii() and epoch.isdigit() and signature):
+        raise HTTPException(status_code=403, detail='Invalid or expired session token')
+    if not hmac.compare_digest(signature.encode(), _sign(f'{room_id}.{epoch}').encode()):
+        raise HTTPException(status_code=403, detail='Invalid or expired session token')
+    return room_id, int(epoch)
+
+
+def passphrase_matches(given: str, expected: str) -> bool:
+    return hmac.compare_digest(given.encode(), expected.encode())
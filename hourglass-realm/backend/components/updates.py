@@ -0,0 +1,106 @@
+import copy, operator
+from datetime import datetime, timezone
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+
+@dataclass
+class StateUpdate:
+    """
+    A targeted change to the game state, addressed by dotted paths (e.g. 'puzzle_1b.stage1_progress.CAR').
+    `expect` holds the conditions it depends on: a plain value means equality, ('<', value) a comparison.
+    Version bookkeeping is left to the store applying it.
+    """
+    set: Dict[str, Any] = field(default_factory=dict)
+    add: Dict[str, int] = field(default_factory=dict)
+    append: Dict[str, Any] = field(default_factory=dict)
+    expect: Dict[str, Any] = field(default_factory=dict)
+
+    def apply(self, state: Dict[str, Any]) -> bool:
+        """Apply in place to a plain dict; returns False without changing anything if a condition fails"""
+        for path, expected in self.expect.items():
+            if not _compare(_get(state, path), expected):
+                return False
+        for path, value in self.set.items():
+            parent, key = _parent(state, path)
+            parent[key] = value
+        for path, amount in self.add.items():
+            parent, key = _parent(state, path)
+            parent[key] = parent.get(key, 0) + amount
+        for path, item in self.append.items():
+            parent, key = _parent(state, path)
+            parent[key] = list(parent.get(key, [])) + [item]
+        return True
+
+    @classmethod
+    def combine(cls, state: Dict[str, Any], updates: List['StateUpdate']) -> 'StateUpdate':
+        """
+        One update with the effect of applying `updates` to `state` in order: every path they write is set to
+        its final value, on condition that every path they read still holds its value in `state`
+        """
+        after = copy.deepcopy(state)
+        for update in updates:
+            if not update.apply(after):
+                raise ValueError('Updates do not apply to this state in order')
+        written = dict.fromkeys(p for u in updates for p in (*u.set, *u.add, *u.append))
+        read = dict.fromkeys(p for u in updates for p in u.expect)
+        return cls(set={p: _get(after, p) for p in written}, expect={p: _get(state, p) for p in read})
+
+    def to_dynamodb(self) -> Dict[str, Any]:
+        """update_item kwargs: also bumps `version`, stamps `updated_at` and requires the item to exist"""
+        names: Dict[str, str] = {'#v': 'version', '#updated_at': 'updated_at', '#pk': 'pk'}
+        values: Dict[str, Any] = {':one': 1, ':updated_at': datetime.now(timezone.utc).isoformat()}
+
+        def name(path: str) -> str:
+            aliases = []
+            for segment in path.split('.'):
+                alias = f'#n{len(names)}'
+                names[alias] = segment
+                aliases.append(alias)
+            return '.'.join(aliases)
+
+        def value(v: Any) -> str:
+            alias = f':v{len(values)}'
+            values[alias] = v
+            return alias
+
+        set_parts = [f'{name(p)} = {value(v)}' for p, v in self.set.items()]
+        for p, item in self.append.items():
+            n = name(p)
+            set_parts.append(f'{n} = list_append({n}, {value([item])})')
+        set_parts.append('#updated_at = :updated_at')
+        add_parts = ['#v :one'] + [f'{name(p)} {value(v)}' for p, v in self.add.items()]
+
+        conditions = ['attribute_exists(#pk)']
+        for p, expected in self.expect.items():
+            op, v = expected if isinstance(expected, tuple) else ('=', expected)
+            conditions.append(f'{name(p)} {op} {value(v)}')
+
+        return {
+            'UpdateExpression': 'SET ' + ', '.join(set_parts) + ' ADD ' + ', '.join(add_parts),
+            'ConditionExpression': ' AND '.join(conditions),
+            'ExpressionAttributeNames': names,
+            'ExpressionAttributeValues': values,
+        }
+
+
+def _get(state: Dict[str, Any], path: str) -> Any:
+    for segment in path.split('.'):
+        state = state.get(segment) if isinstance(state, dict) else None
+    return state
+
+
+def _parent(state: Dict[str, Any], path: str) -> Tuple[Dict[str, Any], str]:
+    *parents, key = path.split('.')
+    for segment in parents:
+        state = state[segment]
+    return state, key
+
+
+_OPERATORS = {'=': operator.eq, '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+def _compare(actual: Any, expected: Any) -> bool:
+    op, value = expected if isinstance(expected, tuple) else ('=', expected)
+    if actual is None:
+        return False
+    return _OPERATORS[op](actual, value)
@@ -0,0 +1,148 @@
+import asyncio, os
+from typing import AsyncIterator, List
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+from starlette.datastructures import FormData
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+from components.imaging import Drawing, DrawingTooLarge, prepare_drawing, prepare_drawing_bytes
+from components.metrics import span
+from components.schema import ChatbotBatchReq, ChatbotReq
+
+
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', str(2 * 1024 * 1024)))
+MAX_BATCH_DRAWINGS = int(os.getenv('MAX_BATCH_DRAWINGS', '5'))
+
+
+async def read_drawing(request: Request) -> Drawing:
+    with span('read_drawing'):
+        return await _read_drawing(request)
+
+
+async def _read_drawing(request: Request) -> Drawing:
+    """
+    Read a /chatbot drawing from any supported body:
+    - application/json: {"image_data": "data:image/png;base64,..."} (ChatbotReq, older clients)
+    - multipart/form-data: an `image` file field
+    - image/* or application/octet-stream: the raw encoded image
+    """
+    content_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail='Drawing is too large')
+
+    try:
+        if content_type in ('', 'application/json'):
+            try:
+                req = ChatbotReq.model_validate_json(await _read_body(request, MAX_UPLOAD_BYTES, 'Drawing is too large'))
+            except ValidationError as e:
+                raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False, include_input=False))
+            return await asyncio.to_thread(prepare_drawing, req.image_data)
+
+        if content_type == 'multipart/form-data':
+            form = await _read_form(request, MAX_UPLOAD_BYTES, 'Drawing is too large', max_files=1)
+            try:
+                upload = form.get('image')
+                if upload is None or isinstance(upload, str):
+                    raise HTTPException(status_code=400, detail="Missing 'image' file field")
+                image_bytes = await upload.read()
+                image_format = (upload.content_type or '').removeprefix('image/') or None
+            finally:
+                await form.close()
+        elif content_type.startswith('image/') or content_type == 'application/octet-stream':
+            image_bytes = await _read_body(request, MAX_UPLOAD_BYTES, 'Drawing is too large')
+            image_format = content_type.removeprefix('image/') if content_type.startswith('image/') else None
+        else:
+            raise HTTPException(status_code=415, detail=f'Unsupported content type: {content_type}')
+
+        if len(image_bytes) > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail='Drawing is too large')
+        return await asyncio.to_thread(prepare_drawing_bytes, image_bytes, image_format)
+
+    except DrawingTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def read_drawings(request: Request) -> List[Drawing]:
+    with span('read_drawing'):
+        return await _read_drawings(request)
+
+
+async def _read_drawings(request: Request) -> List[Drawing]:
+    """
+    Read a /chatbot/batch submission of 1 to MAX_BATCH_DRAWINGS drawings:
+    - application/json: {"images": ["data:image/png;base64,...", ...]} (ChatbotBatchReq)
+    - multipart/form-data: one `image` file field per drawing
+    """
+    content_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES * MAX_BATCH_DRAWINGS:
+        raise HTTPException(status_code=413, detail='Drawings are too large')
+
+    try:
+        if content_type in ('', 'application/json'):
+            try:
+                req = ChatbotBatchReq.model_validate_json(await _read_body(request, MAX_UPLOAD_BYTES * MAX_BATCH_DRAWINGS, 'Drawings are too large'))
+            except ValidationError as e:
+                raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False, include_input=False))
+            _check_batch_size(len(req.images))
+            return [await asyncio.to_thread(prepare_drawing, image_data) for image_data in req.images]
+
+        if content_type == 'multipart/form-data':
+            form = await _read_form(request, MAX_UPLOAD_BYTES * MAX_BATCH_DRAWINGS, 'Drawings are too large', max_files=MAX_BATCH_DRAWINGS)
+            try:
+                uploads = form.getlist('image')
+                if any(isinstance(upload, str) for upload in uploads):
+                    raise HTTPException(status_code=400, detail="'image' fields must be files")
+                _check_batch_size(len(uploads))
+                drawings = []
+                for upload in uploads:
+                    image_bytes = await upload.read()
+                    if len(image_bytes) > MAX_UPLOAD_BYTES:
+                        raise HTTPException(status_code=413, detail='Drawing is too large')
+                    drawings.append(await asyncio.to_thread(prepare_drawing_bytes, image_bytes, (upload.content_type or '').removeprefix('image/') or None))
+                return drawings
+            finally:
+                await form.close()
+
+        raise HTTPException(status_code=415, detail=f'Unsupported content type: {content_type}')
+
+    except DrawingTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _read_body(request: Request, limit: int, detail: str) -> bytes:
+    """The request body, given up with a 413 as soon as it passes `limit` (chunked bodies carry no Content-Length)"""
+    body = bytearray()
+    async for chunk in _limited_stream(request, limit, detail):
+        body += chunk
+    return bytes(body)
+
+
+async def _read_form(request: Request, limit: int, detail: str, max_files: int) -> FormData:
+    """
+    request.form() on the same limited stream: Starlette's own limits leave file parts unbounded (they spool to disk),
+    so the whole body is cut off with a 413 once it passes `limit`
+    """
+    try:
+        return await MultiPartParser(request.headers, _limited_stream(request, limit, detail), max_files=max_files, max_fields=max_files).parse()
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+
+
+async def _limited_stream(request: Request, limit: int, detail: str) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > limit:
+            raise HTTPException(status_code=413, detail=detail)
+        yield chunk
+
+
+def _check_batch_size(count: int):
+    if not 1 <= count <= MAX_BATCH_DRAWINGS:
+        raise HTTPException(status_code=400, detail=f'Send between 1 and {MAX_BATCH_DRAWINGS} drawings')
@@ -0,0 +1,424 @@
+"""
+Load test: N simulated teams drive the FastAPI app in-process, with a fake Gemini
+and, for the DynamoDB store (--store dynamodb or --app main_lambda), moto stand-ins
+for the table and the S3 bucket.
+
+Each team gets its own room, claims it with /enter, polls /data every --poll-interval
+(conditionally, like the browser) and has --players submitting drawings to /chatbot;
+an admin pushes hints to random rooms. The fake classifier sits behind the real
+pre-filter, cache, governor and parsing, and answers after a sampled latency; with
+--cassette, answers and latencies recorded from Gemini are replayed instead.
+
+    python load_test.py --teams 20 --duration 60
+    python load_test.py --app main_lambda --teams 50 --llm-latency lognormal:1.2,0.4 --save results.json
+    python load_test.py --store journal --teams 50
+    python load_test.py --stream --teams 20   # /chatbot/stream, timed to the first reply text too
+    python load_test.py --batch 5 --teams 20  # five drawings per /chatbot/batch request
+    python load_test.py --teams 50 --compare results.json   # exits 1 if p95 or throughput regressed
+    python load_test.py --cassette chatbot_cassette.jsonl --replay-time-scale 0.5
+
+Against a separately started server (there is no fake model then, so replay a cassette there):
+
+    STATE_STORE=sqlite UVICORN_WORKERS=4 CHATBOT_CASSETTE_MODE=replay CHATBOT_REPLAY_STRICT=false python main.py
+    python load_test.py --url http://127.0.0.1:8000 --teams 100
+
+Needs httpx (and moto for the DynamoDB store).
+"""
+import argparse, asyncio, contextlib, io, json, logging, math, os, random, sys, time, types
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+# ============== Stand-ins ==============
+
+def latency_sampler(spec: str, rng: random.Random) -> Callable[[], float]:
+    """fixed:S, uniform:LO,HI, normal:MEAN,SD or lognormal:MEDIAN,SIGMA, in seconds"""
+    kind, _, params = spec.partition(':')
+    values = [float(v) for v in params.split(',') if v]
+    if kind == 'fixed':
+        return lambda: values[0]
+    if kind == 'uniform':
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == 'normal':
+        return lambda: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == 'lognormal':
+        return lambda: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f'Unknown latency distribution: {spec}')
+
+
+def make_drawings(count: int, rng: random.Random) -> List[bytes]:
+    """Random yellow-on-dark polylines like the portal canvas, varied enough to mostly miss the cache"""
+    from PIL import Image, ImageDraw
+    drawings = []
+    for _ in range(count):
+        image = Image.new('RGB', (300, 300), '#1a1a1a')
+        draw = ImageDraw.Draw(image)
+        for _ in range(rng.randint(2, 6)):
+            points = [(rng.randint(40, 260), rng.randint(40, 260)) for _ in range(rng.randint(2, 5))]
+            draw.line(points, fill='#ffd700', width=3)
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        drawings.append(buffer.getvalue())
+    return drawings
+
+
+class FakeClassifier:
+    """Stands in for a structured-output runnable (include_raw=True), hitting a target with probability hit_rate"""
+
+    def __init__(self, chatbot: Any, stage: int, latency: Callable[[], float], hit_rate: float, rng: random.Random):
+        _, self.schema, self.none_category = chatbot.STAGES[stage]
+        enum = type(self.none_category)
+        self.targets = [c for c in enum if c != self.none_category]
+        if stage == 1:
+            self.targets = [enum.JESUS]
+        self.latency, self.hit_rate, self.rng = latency, hit_rate, rng
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self.latency())
+        category = self.rng.choice(self.targets) if self.rng.random() < self.hit_rate else self.none_category
+        # Gemini bills a small image as 258 tokens; the system prompt at roughly 4 characters a token
+        input_tokens = 258 + sum(len(content) for role, content in messages if role == 'system') // 4
+        return {
+            'raw': types.SimpleNamespace(usage_metadata={'input_tokens': input_tokens, 'output_tokens': 45, 'total_tokens': input_tokens + 45}),
+            'parsed': self.schema(response=f'Just keep drawing! Is that a {category.value}?', category=category),
+            'parsing_error': None,
+        }
+
+
+    async def astream(self, messages):
+        """
+        Like the bound model's astream: JSON text chunks with the keys in the schema's order (propertyOrdering,
+        else field order), as Gemini writes them; roughly a third of the latency passes before the first one
+        """
+        from langchain_core.messages import AIMessageChunk
+        latency = self.latency()
+        category = self.rng.choice(self.targets) if self.rng.random() < self.hit_rate else self.none_category
+        values = {'category': category.value, 'response': f'Just keep drawing, just keep drawing! Is that a {category.value}? I forgot already!'}
+        order = self.schema.model_json_schema().get('propertyOrdering') or list(self.schema.model_fields)
+        text = json.dumps({key: values[key] for key in order})
+        pieces = [text[i:i + 16] for i in range(0, len(text), 16)]
+        await asyncio.sleep(latency * 0.3)
+        for i, piece in enumerate(pieces):
+            last = i == len(pieces) - 1
+            usage = {'input_tokens': 441, 'output_tokens': 45, 'total_tokens': 486} if last else None
+            yield AIMessageChunk(content=piece, usage_metadata=usage)
+            if not last:
+                await asyncio.sleep(latency * 0.7 / len(pieces))
+
+
+def install_fake_llm(chatbot: Any, latency: Callable[[], float], hit_rate: float, rng: random.Random):
+    chatbot._registry['config'] = chatbot._llm_config()
+    chatbot._registry['classifiers'] = {stage: FakeClassifier(chatbot, stage, latency, hit_rate, rng) for stage in chatbot.STAGES}
+    chatbot._registry['streamers'] = chatbot._registry['classifiers']
+
+
+def start_aws_stand_ins():
+    """moto-backed DynamoDB table and S3 bucket, created before the app is imported"""
+    try:
+        from moto import mock_aws
+    except ImportError:
+        sys.exit('The DynamoDB store needs moto (pip install "moto[dynamodb,s3]")')
+    for key, value in {'AWS_ACCESS_KEY_ID': 'testing', 'AWS_SECRET_ACCESS_KEY': 'testing', 'AWS_DEFAULT_REGION': 'us-east-1'}.items():
+        os.environ.setdefault(key, value)
+    os.environ.setdefault('DYNAMODB_TABLE_NAME', 'loadtest-game-state')
+    os.environ.setdefault('S3_BUCKET_NAME', 'loadtest-archive')
+    mock = mock_aws()
+    mock.start()
+    import boto3
+    boto3.client('dynamodb').create_table(
+        TableName=os.environ['DYNAMODB_TABLE_NAME'],
+        KeySchema=[{'AttributeName': 'pk', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'pk', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST',
+    )
+    boto3.client('s3').create_bucket(Bucket=os.environ['S3_BUCKET_NAME'])
+    return mock
+
+
+# ============== Simulation ==============
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[Tuple[float, int]]] = {}  # endpoint -> [(seconds, status)]
+
+    async def request(self, client: Any, endpoint: str, method: str, url: str, **kwargs) -> Any:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            status = response.status_code
+        except Exception as e:
+            logging.warning(f'{endpoint} failed: {e!r}')
+            response, status = None, 599
+        self.samples.setdefault(endpoint, []).append((time.perf_counter() - start, status))
+        return response
+
+    async def stream(self, client: Any, endpoint: str, method: str, url: str, **kwargs):
+        """A Server-Sent Events request, timed to its first `text` event (what the player waits for) and to its end"""
+        start = time.perf_counter()
+        first, status = None, 599
+        try:
+            async with client.stream(method, url, **kwargs) as response:
+                status = response.status_code
+                async for line in response.aiter_lines():
+                    if first is None and line in ('event: text', 'event: done'):
+                        first = time.perf_counter() - start
+                    elif line == 'event: error':
+                        status = 503
+        except Exception as e:
+            logging.warning(f'{endpoint} failed: {e!r}')
+        elapsed = time.perf_counter() - start
+        self.samples.setdefault(endpoint, []).append((elapsed, status))
+        self.samples.setdefault(f'{endpoint} first', []).append((first if first is not None else elapsed, status))
+
+
+async def sleep_within(delay: float, deadline: float):
+    """Sleep for delay, but wake at the deadline so the run ends on time"""
+    await asyncio.sleep(max(0.0, min(delay, deadline - time.perf_counter())))
+
+
+async def run_team(client: Any, recorder: Recorder, args: argparse.Namespace, team: int, drawings: List[bytes], deadline: float, rng: random.Random):
+    room = f'team-{team}'
+    admin = {'Authorization': f'Bearer {args.admin_passphrase}'}
+    await recorder.request(client, 'POST /reset', 'POST', f'/reset?room={room}', headers=admin)
+    response = await recorder.request(client, 'POST /enter', 'POST', f'/enter?room={room}')
+    if response is None or response.status_code != 200:
+        return
+    auth = {'Authorization': f"Bearer {response.json()['portalToken']}"}
+    solved = False  # like the portal, players stop drawing once both pins are shown
+
+    async def poll():
+        nonlocal solved
+        etag = None
+        await sleep_within(rng.uniform(0, args.poll_interval), deadline)
+        while time.perf_counter() < deadline:
+            headers = {**auth, **({'If-None-Match': etag} if etag else {})}
+            response = await recorder.request(client, 'GET /data', 'GET', '/data', headers=headers)
+            if response is not None and response.status_code == 200:
+                etag = response.headers.get('etag')
+                solved = len(response.json()['puzzle_1b']['pins']) >= 2
+            await sleep_within(args.poll_interval, deadline)
+
+    async def player():
+        while True:
+            await sleep_within(rng.expovariate(1 / args.drawing_interval), deadline)
+            if time.perf_counter() >= deadline:
+                return
+            if solved:
+                continue
+            if args.batch:
+                files = [('image', (f'drawing-{i}.png', rng.choice(drawings), 'image/png')) for i in range(args.batch)]
+                await recorder.request(client, 'POST /chatbot/batch', 'POST', '/chatbot/batch', headers=auth, files=files)
+                continue
+            submit = recorder.stream if args.stream else recorder.request
+            await submit(
+                client, 'POST /chatbot/stream' if args.stream else 'POST /chatbot', 'POST', '/chatbot/stream' if args.stream else '/chatbot',
+                headers={**auth, 'Content-Type': 'image/png'}, content=rng.choice(drawings),
+            )
+
+    await asyncio.gather(poll(), *(player() for _ in range(args.players)))
+
+
+async def run_admin(client: Any, recorder: Recorder, args: argparse.Namespace, deadline: float, rng: random.Random):
+    admin = {'Authorization': f'Bearer {args.admin_passphrase}'}
+    hint = 0
+    while True:
+        await sleep_within(args.admin_interval, deadline)
+        if time.perf_counter() >= deadline:
+            return
+        hint += 1
+        room = f'team-{rng.randrange(args.teams)}'
+        await recorder.request(client, 'POST /admin', 'POST', f'/admin?room={room}', headers=admin, json={'hints': [f'Hint #{hint}']})
+
+
+async def drive(client: Any, args: argparse.Namespace) -> Tuple[Recorder, float, Dict[str, Any]]:
+    """Run every team and the admin until --duration is up; returns the samples, elapsed seconds and the server's /health"""
+    rng = random.Random(args.seed)
+    drawings = make_drawings(args.distinct_drawings, rng)
+    recorder = Recorder()
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(
+        run_admin(client, recorder, args, deadline, rng),
+        *(run_team(client, recorder, args, team, drawings, deadline, rng) for team in range(args.teams)),
+    )
+    # Every request is issued within the window, so rates are over it; the last responses may land a little after
+    elapsed = min(time.perf_counter() - start, args.duration)
+    return recorder, elapsed, (await client.get('/health')).json()
+
+
+async def simulate(args: argparse.Namespace) -> Tuple[Recorder, float, Dict[str, Any]]:
+    import httpx
+    if args.url:
+        # A server started separately, e.g. with several workers; it answers with its own model or cassette
+        async with httpx.AsyncClient(base_url=args.url, timeout=None, limits=httpx.Limits(max_connections=None)) as client:
+            return await drive(client, args)
+    app = __import__(args.app).app
+    async with app.router.lifespan_context(app):
+        from components import chatbot
+        if not args.cassette:
+            install_fake_llm(chatbot, latency_sampler(args.llm_latency, random.Random(args.seed)), args.hit_rate, random.Random(args.seed))
+        if args.stream:
+            # ASGITransport hands over a response only once it is complete, so streams go through a real socket
+            async with serve_on_loopback(app) as url:
+                async with httpx.AsyncClient(base_url=url, timeout=None, limits=httpx.Limits(max_connections=None)) as client:
+                    return await drive(client, args)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://loadtest', timeout=None) as client:
+            return await drive(client, args)
+
+
+@contextlib.asynccontextmanager
+async def serve_on_loopback(app: Any):
+    """uvicorn on a free loopback port in this event loop, around an app whose lifespan is already running"""
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=0, lifespan='off', log_level='warning'))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    host, port = server.servers[0].sockets[0].getsockname()[:2]
+    try:
+        yield f'http://{host}:{port}'
+    finally:
+        server.should_exit = True
+        await task
+
+
+# ============== Report ==============
+
+def build_results(args: argparse.Namespace, recorder: Recorder, elapsed: float, health: Dict[str, Any]) -> Dict[str, Any]:
+    endpoints = {}
+    total = 0
+    for endpoint, samples in sorted(recorder.samples.items()):
+        latency = np.array([s for s, _ in samples])
+        status = np.array([c for _, c in samples])
+        codes, counts = np.unique(status, return_counts=True)
+        p50, p95, p99 = np.percentile(latency, [50, 95, 99])
+        if not endpoint.endswith(' first'):  # a timing of a request already counted
+            total += len(samples)
+        endpoints[endpoint] = {
+            'requests': len(samples),
+            'rps': round(len(samples) / elapsed, 2),
+            'errors': int(np.sum(status >= 500)),
+            'status': {str(c): int(n) for c, n in zip(codes, counts)},
+            'mean': round(float(latency.mean()), 4),
+            'p50': round(float(p50), 4),
+            'p95': round(float(p95), 4),
+            'p99': round(float(p99), 4),
+            'max': round(float(latency.max()), 4),
+        }
+
+    chatbot_ok = sum(endpoints.get(e, {}).get('status', {}).get('200', 0) for e in ('POST /chatbot', 'POST /chatbot/stream', 'POST /chatbot/batch'))
+    # Re-plans after a lost update; SQLite's own compare-and-set retries are in `store`
+    updates = health.get('updates', {'conflicts': 0, 'retries': 0, 'exhausted': 0})
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('save', 'compare', 'admin_passphrase')},
+        'duration_seconds': round(elapsed, 2),
+        'requests': total,
+        'throughput_rps': round(total / elapsed, 2),
+        'endpoints': endpoints,
+        'conflicts': {
+            **updates,
+            'rate': round(updates['conflicts'] / chatbot_ok, 4) if chatbot_ok else 0.0,
+            'http_409': endpoints.get('POST /chatbot', {}).get('status', {}).get('409', 0),
+        },
+        # From one worker's /health when the server runs several
+        **{key: health.get(key) for key in ('llm', 'breaker', 'cache', 'prefilter', 'cassette', 'flights', 'store')},
+    }
+
+
+def print_results(results: Dict[str, Any]):
+    print(f"{results['requests']} requests in {results['duration_seconds']}s, {results['throughput_rps']} req/s")
+    print(f"  {'endpoint':<26} {'n':>7} {'rps':>8} {'err':>5} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for endpoint, row in results['endpoints'].items():
+        print(f"  {endpoint:<26} {row['requests']:>7} {row['rps']:>8} {row['errors']:>5} "
+              f"{row['p50']:>8.4f} {row['p95']:>8.4f} {row['p99']:>8.4f} {row['max']:>8.4f}")
+    conflicts = results['conflicts']
+    print(f"  conflicts {conflicts['conflicts']} (rate {conflicts['rate']:.2%} of drawings), retries {conflicts['retries']}, "
+          f"exhausted {conflicts['exhausted']}, 409s {conflicts['http_409']}")
+    print(f"  llm calls {results['llm']['total_calls']}, max wait {results['llm']['max_wait_seconds']}s, "
+          f"cache hit rate {results['cache']['hit_rate']:.2%}, prefilter avoided {results['prefilter']['llm_calls_avoided']}")
+
+
+def compare_results(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> bool:
+    """Print p95 and throughput changes against a saved run; True if anything regressed beyond threshold"""
+    regressed = False
+    print(f"Compared with the {baseline['config']['app']} run of {baseline['timestamp']}:")
+    for endpoint, row in results['endpoints'].items():
+        before = baseline['endpoints'].get(endpoint)
+        if not before or not before['p95']:
+            continue
+        change = row['p95'] / before['p95'] - 1
+        flag = '  REGRESSION' if change > threshold else ''
+        regressed |= bool(flag)
+        print(f"  {endpoint:<26} p95 {before['p95']:.4f}s -> {row['p95']:.4f}s ({change:+.1%}){flag}")
+    change = results['throughput_rps'] / baseline['throughput_rps'] - 1 if baseline['throughput_rps'] else 0.0
+    flag = '  REGRESSION' if change < -threshold else ''
+    regressed |= bool(flag)
+    print(f"  throughput {baseline['throughput_rps']} -> {results['throughput_rps']} req/s ({change:+.1%}){flag}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Drive the backend with simulated teams against local stand-ins')
+    parser.add_argument('--app', default='main', choices=['main', 'main_lambda'])
+    submission = parser.add_mutually_exclusive_group()
+    submission.add_argument('--stream', action='store_true', help='submit drawings to /chatbot/stream; its "first" row is the time to the first reply text')
+    submission.add_argument('--batch', type=int, default=0, metavar='N', help='submit N drawings per request to /chatbot/batch')
+    parser.add_argument('--store', choices=['memory', 'journal', 'sqlite', 'dynamodb'], help='STATE_STORE for the in-process app (main_lambda defaults to dynamodb)')
+    parser.add_argument('--url', help='drive a running server instead (e.g. main.py with UVICORN_WORKERS=4); --app and the stand-ins are then unused')
+    parser.add_argument('--teams', type=int, default=10)
+    parser.add_argument('--players', type=int, default=2, help='players drawing concurrently per team')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds')
+    parser.add_argument('--poll-interval', type=float, default=5.0, help='seconds between /data polls (POLL_INTERVAL)')
+    parser.add_argument('--drawing-interval', type=float, default=8.0, help='mean seconds between drawings per player')
+    parser.add_argument('--admin-interval', type=float, default=5.0, help='seconds between admin hint updates')
+    parser.add_argument('--llm-latency', default='lognormal:1.5,0.35', help='fixed:S, uniform:LO,HI, normal:MEAN,SD or lognormal:MEDIAN,SIGMA')
+    parser.add_argument('--cassette', help='replay answers and latencies recorded with CHATBOT_CASSETTE_MODE=record instead of the fake model')
+    parser.add_argument('--replay-time-scale', type=float, default=1.0, help='multiplier on recorded latencies, 0 answers at once')
+    parser.add_argument('--hit-rate', type=float, default=0.3, help='chance the fake model recognises a target')
+    parser.add_argument('--distinct-drawings', type=int, default=200)
+    parser.add_argument('--admin-passphrase', default=os.getenv('ADMIN_PASSPHRASE', 'changeme'))
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='results JSON of an earlier run to compare against')
+    parser.add_argument('--regression-threshold', type=float, default=0.2, help='relative p95/throughput change that counts as a regression')
+    args = parser.parse_args(argv)
+
+    os.environ['ADMIN_PASSPHRASE'] = args.admin_passphrase
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    if args.cassette:
+        # Synthetic drawings were never recorded, so serve each one a recording of its stage
+        os.environ.update({
+            'CHATBOT_CASSETTE_MODE': 'replay',
+            'CHATBOT_CASSETTE_PATH': args.cassette,
+            'CHATBOT_REPLAY_TIME_SCALE': str(args.replay_time_scale),
+            'CHATBOT_REPLAY_STRICT': 'false',
+        })
+    if args.store:
+        os.environ['STATE_STORE'] = args.store
+    dynamodb = args.store == 'dynamodb' or args.app == 'main_lambda' and not args.store
+    mock = start_aws_stand_ins() if dynamodb and not args.url else None
+    try:
+        recorder, elapsed, health = asyncio.run(simulate(args))
+        results = build_results(args, recorder, elapsed, health)
+    finally:
+        if mock is not None:
+            mock.stop()
+
+    print_results(results)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare_results(results, baseline, args.regression_threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,90 @@
-import logging, os, uuid
+import asyncio, functools, logging, os, random, time, uuid
 import uvicorn
 
-from fastapi import FastAPI, Header, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from typing import Any, Optional, Dict
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Dict, Tuple
 from datetime import datetime, timedelta, timezone
 
-from components.chatbot import chatbot_pipeline, ObjectCategory2
-from components.schema import *
+# Before the components below, which read their settings when imported
+from components.envfile import load_env_file
+load_env_file()
 
+from components.archive import ArchiveUploader, LocalSink, S3Sink
+from components.aws import get_s3_client
+from components.chatbot import chatbot_pipeline_async, chatbot_pipeline_stream, warm_classifiers, WARM_CLASSIFIERS_ON_STARTUP, LLM_GOVERNOR, REGISTRY_STATS, CLASSIFICATION_CACHE, PREFILTER_STATS, CHATBOT_CASSETTE, CHATBOT_FLIGHTS, LLM_BREAKER, ModelUnavailable, still_thinking_reply
+from components.etag import state_etag, etag_matches
+from components.events import StateBroadcaster, game_event_stream, sse_event
+from components.game import plan_drawing, plan_drawings, compose_reply, reply_starts_with_response
+from components.rooms import validate_room_id, startup_room_ids
+from components.governor import GovernorBusy
+from components.imaging import Drawing
+from components.metrics import STATE_CONFLICTS, metrics_response, register_stats, span, timing_middleware
+from components.schema import *
+from components.singleflight import FlightLimitReached
+from components.statestore import open_state_store
+from components.tokens import issue_session_token, verify_session_token, new_session_epoch, passphrase_matches
+from components.updates import StateUpdate
+from components.uploads import read_drawing, read_drawings
 
-env_path = os.path.join(os.path.dirname(__file__), '.env')
-if os.path.exists(env_path):
-    from dotenv import load_dotenv
-    load_dotenv(env_path)
 
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
 )
-app = FastAPI()
+
+
+# ============== Archive ==============
+
+ARCHIVE_MAX_QUEUE = int(os.getenv('ARCHIVE_MAX_QUEUE', '256'))
+ARCHIVE_CONCURRENCY = int(os.getenv('ARCHIVE_CONCURRENCY', '4'))
+ARCHIVE_DRAIN_SECONDS = float(os.getenv('ARCHIVE_DRAIN_SECONDS', '10'))
+ARCHIVE_MANIFEST_BATCH = int(os.getenv('ARCHIVE_MANIFEST_BATCH', '50'))
+ARCHIVE_MANIFEST_SECONDS = float(os.getenv('ARCHIVE_MANIFEST_SECONDS', '60'))
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', None)  # archive to a local directory instead of S3
+
+def archive_sink():
+    # Skip uploading if neither a bucket nor a local directory is configured
+    if ARCHIVE_DIR:
+        return LocalSink(ARCHIVE_DIR)
+    bucket = os.getenv('S3_BUCKET_NAME', None)
+    # One client shared by all upload workers, each upload puts two objects at once
+    return S3Sink(bucket, lambda: get_s3_client(max(10, ARCHIVE_CONCURRENCY * 2))) if bucket else None
+
+ARCHIVER = ArchiveUploader(
+    archive_sink(),
+    max_queue=ARCHIVE_MAX_QUEUE,
+    concurrency=ARCHIVE_CONCURRENCY,
+    manifest_batch=ARCHIVE_MANIFEST_BATCH,
+    manifest_interval=ARCHIVE_MANIFEST_SECONDS,
+)
+
+
+# ============== Startup ==============
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    STORE.start()
+    # Every worker and instance runs this; warm starts find every room (in one batched read) and write nothing
+    room_ids = startup_room_ids()
+    known = STORE.existing(room_ids)
+    for room_id in room_ids:
+        if room_id not in known:
+            STORE.create(room_id, reset_game_state())
+    if WARM_CLASSIFIERS_ON_STARTUP:
+        try:
+            warm_classifiers()
+        except Exception as e:
+            logging.warning(f"Could not warm classifiers, they will be built on first use: {e}")
+    ARCHIVER.start()
+    yield
+    await ARCHIVER.stop(ARCHIVE_DRAIN_SECONDS)
+    STORE.close()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,16 +92,43 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=['*'],
     allow_headers=['*'],
+    expose_headers=['ETag', 'Server-Timing'],
 )
 
+@app.middleware('http')
+async def state_request_scope(request: Request, call_next):
+    # Stores with a read cache answer repeated reads of a room within one request from a per-request memo
+    with STORE.request_scope():
+        return await call_next(request)
+
+# Added last so it wraps everything else and times the whole request
+app.middleware('http')(timing_middleware)
+
+register_stats('hourglass_llm', LLM_GOVERNOR.stats)
+register_stats('hourglass_llm_breaker', LLM_BREAKER.stats)
+register_stats('hourglass_classifiers', lambda: REGISTRY_STATS)
+register_stats('hourglass_classification_cache', CLASSIFICATION_CACHE.stats)
+register_stats('hourglass_prefilter', lambda: PREFILTER_STATS)
+register_stats('hourglass_cassette', CHATBOT_CASSETTE.stats)
+register_stats('hourglass_chatbot_flights', CHATBOT_FLIGHTS.stats)
+register_stats('hourglass_archive', ARCHIVER.stats)
+
 ADMIN_PASSPHRASE = os.getenv('ADMIN_PASSPHRASE', 'changeme')
+UPDATE_MAX_ATTEMPTS = int(os.getenv('UPDATE_MAX_ATTEMPTS', '5'))
+UPDATE_BACKOFF_BASE = float(os.getenv('UPDATE_BACKOFF_BASE_SECONDS', '0.02'))
+UPDATE_BACKOFF_CAP = float(os.getenv('UPDATE_BACKOFF_CAP_SECONDS', '0.5'))
+UPDATE_STATS = {'conflicts': 0, 'retries': 0, 'exhausted': 0}
+UVICORN_WORKERS = int(os.getenv('UVICORN_WORKERS', '1'))
 
 
 # ============== Helper Functions ==============
 
 def reset_game_state() -> Dict[str, Any]:
     return {
+        'version': 1,
+        'created_at': datetime.now(timezone.utc).isoformat(),
         'active_token': str(uuid.uuid4()),
+        'session_epoch': 0,
         'token_claim_time': datetime.now(timezone.utc).isoformat(),
         'target_time': (datetime.now(timezone.utc) + timedelta(minutes=60)).isoformat(),
         'hints': [],
@@ -53,21 +143,115 @@ def reset_game_state() -> Dict[str, Any]:
         'complete': False,
     }
 
-# In-memory state (local only)
-STATE = reset_game_state()
+def room_summary(room_id: str, state: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'room_id': room_id,
+        'version': state['version'],
+        'created_at': state['created_at'],
+        'target_time': state['target_time'],
+        'completed_stage': state['puzzle_1b']['completed_stage'],
+        'complete': state['complete'],
+    }
+
+# Game state per room, in the store named by STATE_STORE (memory, journal, sqlite or dynamodb)
+STORE = open_state_store()
+register_stats('hourglass_state_store', STORE.stats)
+register_stats('hourglass_state_updates', lambda: UPDATE_STATS)
+if STORE.name == 'dynamodb':
+    register_stats('hourglass_state_cache', STORE.cache.stats)
+    register_stats('hourglass_dynamodb_calls', lambda: STORE.calls)
+
+# On Lambda (the dynamodb store) every open /events stream holds an execution environment of its own, polling
+# DynamoDB by itself, and is buffered unless AWS_LWA_INVOKE_MODE=response_stream; so there it is opt-in,
+# and polls no more often than the portal's 5 s /data polling would
+EVENTS_ENABLED = os.getenv('EVENTS_ENABLED', 'false' if STORE.name == 'dynamodb' else 'true').lower() == 'true'
+EVENTS_POLL_SECONDS = float(os.getenv('EVENTS_POLL_SECONDS', '5' if STORE.name == 'dynamodb' else '2'))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv('EVENTS_HEARTBEAT_SECONDS', '15'))
+EVENTS_MAX_SECONDS = float(os.getenv('EVENTS_MAX_SECONDS', '300'))
+
+def poll_game_state(room_id: str, known: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Cheap change check for /events: only load the full state when another worker moved its version"""
+    stamp = STORE.stamp(room_id)
+    if stamp is None or known is not None and stamp == (known.get('version'), known.get('created_at')):
+        return None
+    return STORE.get(room_id, fresh=True)
+
+# Pushes each room's state to its open /events streams; with a shared store, also polls for other workers' writes
+BROADCASTERS: Dict[str, StateBroadcaster] = {}
+
+def get_broadcaster(room_id: str) -> StateBroadcaster:
+    if room_id not in BROADCASTERS:
+        poll = functools.partial(poll_game_state, room_id) if STORE.shared else None
+        BROADCASTERS[room_id] = StateBroadcaster(poll=poll, interval=EVENTS_POLL_SECONDS)
+        state = STORE.get(room_id)
+        if state is not None:
+            BROADCASTERS[room_id].publish(state)
+    return BROADCASTERS[room_id]
+
+def get_game_state(room_id: str) -> Dict[str, Any]:
+    state = STORE.get(room_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f'Room {room_id} not found')
+    return state
+
+def update_game_state(room_id: str, update: StateUpdate) -> Optional[Dict[str, Any]]:
+    """Apply a targeted update (bumping the version) and push the result to /events; None if a condition failed"""
+    state = STORE.update(room_id, update)
+    if state is not None:
+        get_broadcaster(room_id).publish(state)
+    return state
+
+async def mutate_game_state(room_id: str, plan: Callable[[Dict[str, Any]], Tuple[Any, Optional[StateUpdate]]]) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Run plan(state) -> (result, update or None) and apply the update. When its conditions fail
+    because another request or worker wrote first, re-read and re-plan with bounded, jittered exponential backoff
+    """
+    state = get_game_state(room_id)
+    for attempt in range(UPDATE_MAX_ATTEMPTS):
+        result, update = plan(state)
+        if update is None:
+            return result, state
+        updated = update_game_state(room_id, update)
+        if updated is not None:
+            return result, updated
+        UPDATE_STATS['conflicts'] += 1
+        STATE_CONFLICTS.inc(room_id)
+        if attempt + 1 == UPDATE_MAX_ATTEMPTS:
+            break
+        UPDATE_STATS['retries'] += 1
+        await asyncio.sleep(random.uniform(0, min(UPDATE_BACKOFF_CAP, UPDATE_BACKOFF_BASE * 2 ** attempt)))
+        state = STORE.get(room_id, fresh=True)
+        if state is None:
+            raise HTTPException(status_code=404, detail=f'Room {room_id} not found')
+    UPDATE_STATS['exhausted'] += 1
+    raise HTTPException(status_code=409, detail='Game state is busy, please retry')
+
+def data_payload(state: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'remaining_time': state['target_time'],
+        'hints': state['hints'],
+        'puzzle_1b': {
+            'count': state['puzzle_1b']['stage1_count'],
+            'pins': state['puzzle_1b']['pins']
+        },
+        'complete': state['complete'],
+    }
 
-def validate_session_token(authorization: Optional[str] = Header(None)):
+def validate_session_token(authorization: Optional[str] = Header(None)) -> Tuple[str, Dict[str, Any]]:
     if not authorization or not authorization.startswith('Bearer '):
         raise HTTPException(status_code=401, detail='Missing token')
-    tkn = authorization.split(' ')[1]
-    if STATE.get('active_token') != tkn:
+    # Signature first, so forged or malformed tokens never reach the state
+    room_id, epoch = verify_session_token(authorization.split(' ')[1])
+    state = STORE.get(room_id)
+    if state is None or state.get('session_epoch') != epoch:
         raise HTTPException(status_code=403, detail='Invalid or expired session token')
+    return room_id, state
 
 def validate_admin_passphrase(authorization: Optional[str] = Header(None)):
     if not authorization or not authorization.startswith('Bearer '):
         raise HTTPException(status_code=401, detail='Admin passphrase required')
     passphrase = authorization.split(' ')[1]
-    if ADMIN_PASSPHRASE != passphrase:
+    if not passphrase_matches(passphrase, ADMIN_PASSPHRASE):
         raise HTTPException(status_code=403, detail='Invalid admin passphrase')
 
 
@@ -75,98 +259,309 @@ def validate_admin_passphrase(authorization: Optional[str] = Header(None)):
 
 @app.get('/health')
 async def health_check():
-    return {'status': 'ok'}
+    return {'status': 'ok', 'llm': LLM_GOVERNOR.stats(), 'breaker': LLM_BREAKER.stats(), 'classifiers': REGISTRY_STATS, 'cache': CLASSIFICATION_CACHE.stats(), 'prefilter': PREFILTER_STATS, 'cassette': CHATBOT_CASSETTE.stats(), 'flights': CHATBOT_FLIGHTS.stats(), 'store': STORE.stats(), 'updates': UPDATE_STATS, 'archive': ARCHIVER.stats()}
+
+@app.get('/metrics')
+async def metrics():
+    # Prometheus text format; per-stage spans, token usage and the stats from /health
+    return metrics_response()
 
 @app.post('/enter')
-async def enter():
-    tkn = str(uuid.uuid4())
-    STATE['active_token'] = tkn
-    STATE['token_claim_time'] = datetime.now(timezone.utc).isoformat()
-    print(f'New session claimed: {tkn}')
+async def enter(room: Optional[str] = None):
+    room_id = validate_room_id(room)
+    epoch = new_session_epoch()
+    tkn = issue_session_token(room_id, epoch)
+    # The epoch in the store is what every worker checks tokens against
+    claimed = update_game_state(room_id, StateUpdate(set={
+        'session_epoch': epoch,
+        'active_token': tkn,
+        'token_claim_time': datetime.now(timezone.utc).isoformat(),
+    }))
+    if claimed is None:
+        raise HTTPException(status_code=404, detail=f'Room {room_id} not found')
     return {'portalToken': tkn}
 
 @app.get('/data')
-async def get_data(authorization: Optional[str] = Header(None)):
-    validate_session_token(authorization)
-    return {
-        'remaining_time': STATE['target_time'],
-        'hints': STATE['hints'],
-        'puzzle_1b': {
-            'count': STATE['puzzle_1b']['stage1_count'],
-            'pins': STATE['puzzle_1b']['pins']
-        },
-        'complete': STATE['complete'],
-    }
+async def get_data(response: Response, authorization: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
+    room_id, state = validate_session_token(authorization)
+    etag = state_etag(state)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return data_payload(state)
+
+@app.get('/events')
+async def get_events(token: Optional[str] = None, authorization: Optional[str] = Header(None)):
+    # EventSource cannot set headers, so the token may also come as a query parameter.
+    # Needs AWS_LWA_INVOKE_MODE=response_stream when running behind the Lambda Web Adapter.
+    authorization = authorization or (f'Bearer {token}' if token else None)
+    room_id, _ = validate_session_token(authorization)
+    if not EVENTS_ENABLED:
+        # EventSource gives up on a non-200 answer and the portal falls back to polling /data
+        raise HTTPException(status_code=404, detail='Pushed updates are disabled, poll /data')
+    return StreamingResponse(
+        game_event_stream(get_broadcaster(room_id), authorization.split(' ')[1], data_payload, EVENTS_HEARTBEAT_SECONDS, EVENTS_MAX_SECONDS),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
 @app.post('/unlock')
 async def unlock(req: UnlockReq, authorization: Optional[str] = Header(None)):
-    validate_session_token(authorization)
-    if req.passphrase.strip().lower() == STATE['master_codes']['passphrase'].lower():
-        STATE['complete'] = True
+    room_id, state = validate_session_token(authorization)
+    if req.passphrase.strip().lower() == state['master_codes']['passphrase'].lower():
+        update_game_state(room_id, StateUpdate(set={'complete': True}))
         return JSONResponse({'unlocked': True})
     raise HTTPException(status_code=403, detail='Wrong passphrase')
 
 @app.post('/chatbot')
-async def chatbot(req: ChatbotReq, authorization: Optional[str] = Header(None)):
-    validate_session_token(authorization)
-    category, response = chatbot_pipeline(req.image_data, completed_stage=STATE['puzzle_1b']['completed_stage'])
-    if category:
-        if STATE['puzzle_1b']['completed_stage'] == 0:
-            category_str = category.value.upper()
-            if STATE['puzzle_1b']['stage1_progress'][category_str] is False:
-                STATE['puzzle_1b']['stage1_progress'][category_str] = True
-                STATE['puzzle_1b']['stage1_count'] += 1
-                if STATE['puzzle_1b']['stage1_count'] == 5:
-                    response += "\n\nAll five drawings? Wowza! You did it! PIN time—uh, where did I put it again?"
-                    STATE['puzzle_1b']['completed_stage'] = 1
-                    STATE['puzzle_1b']['pins'].append(STATE['master_codes']['puzzle_1b_pins'][0])
-                else:
-                    response += f"\n\nYou've found the {category_str} drawing, only {5 - STATE['puzzle_1b']['stage1_count']} more—right? I think so!"
-            else:
-                response += f"\n\nHeyyy, déjà blue! You’ve drawn {category_str} before—try something new!"
-        elif STATE['puzzle_1b']['completed_stage'] == 1:
-            response += '\n\nPIN? Oh! I already gave you one! …I think. Maybe. Probably?'
-            if category == ObjectCategory2.JESUS:
-                response = ''
-                STATE['puzzle_1b']['completed_stage'] = 2
-                STATE['puzzle_1b']['pins'].append(STATE['master_codes']['puzzle_1b_pins'][1])
+async def chatbot(request: Request, authorization: Optional[str] = Header(None)):
+    room_id, state = validate_session_token(authorization)
+    drawing = await read_drawing(request)
+    # Repeated clicks on submit attach to the classification already running for this session and drawing,
+    # whether it was submitted here or to /chatbot/stream
+    try:
+        response = await CHATBOT_FLIGHTS.run(
+            authorization.split(' ')[1], drawing.digest, lambda: classify_drawing(room_id, state, drawing), from_items=reply_from_stream,
+        )
+    except FlightLimitReached:
+        return {'response': still_thinking_reply()}
+    except ModelUnavailable as e:
+        # The model timed out, failed or is circuit-broken: answer in character and leave the game as it is
+        return {'response': e.reply}
     return {'response': response}
 
+async def classify_drawing(room_id: str, state: Dict[str, Any], drawing: Drawing) -> str:
+    stage = state['puzzle_1b']['completed_stage']
+    start = time.perf_counter()
+    try:
+        category, response = await chatbot_pipeline_async(drawing, completed_stage=stage)
+    except GovernorBusy:
+        raise HTTPException(status_code=503, detail='Treasure Guardian is busy, please try again', headers={'Retry-After': '5'})
+    response, _ = await commit_drawing(room_id, stage, drawing, category, response, time.perf_counter() - start)
+    return response
+
+async def commit_drawing(room_id: str, stage: int, drawing: Drawing, category: Any, response: str, latency: float) -> Tuple[str, Dict[str, Any]]:
+    """Apply a classified drawing to the game and archive it; returns the composed reply and the state after the update"""
+    # Planned against the latest state after the model call (it may have been reset or changed by another worker);
+    # only the write is retried on conflict, never the model call
+    with span('state_write'):
+        outcome, state = await mutate_game_state(room_id, lambda current: plan_drawing(current, category))
+    response = compose_reply(response, outcome, category, state)
+    ARCHIVER.submit(
+        room_id, drawing, response,
+        stage=int(stage), category=category.name if category else None, outcome=outcome.value, source=drawing.answered_by, latency=round(latency, 4),
+    )
+    return response, state
+
+@app.post('/chatbot/batch')
+async def chatbot_batch(request: Request, authorization: Optional[str] = Header(None)):
+    """
+    Several drawings at once (say, all five stage 1 targets): classified concurrently under the LLM governor and
+    applied to the game in one update, in the order given. Returns one reply per drawing and the puzzle counts
+    """
+    room_id, state = validate_session_token(authorization)
+    drawings = await read_drawings(request)
+    # The batch takes one of the session's in-flight slots like a single submit; the same batch again joins it
+    try:
+        return await CHATBOT_FLIGHTS.run(
+            authorization.split(' ')[1], tuple(d.digest for d in drawings), lambda: classify_drawings(room_id, state, drawings),
+        )
+    except FlightLimitReached:
+        return {'responses': [still_thinking_reply() for _ in drawings], **data_payload(state)['puzzle_1b']}
+
+async def classify_drawings(room_id: str, state: Dict[str, Any], drawings: List[Drawing]) -> Dict[str, Any]:
+    stage = state['puzzle_1b']['completed_stage']
+    start = time.perf_counter()
+    # Identical drawings in a batch are classified once (the second one then counts as a duplicate); the distinct
+    # ones all go at once, and the LLM governor decides how many of them reach the model together
+    unique = {d.digest: d for d in drawings}
+    results = await asyncio.gather(*(chatbot_pipeline_async(d, completed_stage=stage) for d in unique.values()), return_exceptions=True)
+    latency = time.perf_counter() - start
+    if all(isinstance(r, GovernorBusy) for r in results):
+        raise HTTPException(status_code=503, detail='Treasure Guardian is busy, please try again', headers={'Retry-After': '5'})
+    answers = dict(zip(unique, results))
+
+    # Drawings the model could not get to are answered in character and leave the game as it is
+    replies: List[Optional[str]] = []
+    answered = []
+    for i, drawing in enumerate(drawings):
+        answer = answers[drawing.digest]
+        if isinstance(answer, GovernorBusy):
+            replies.append(still_thinking_reply())
+        elif isinstance(answer, ModelUnavailable):
+            replies.append(answer.reply)
+        elif isinstance(answer, BaseException):
+            raise answer
+        else:
+            replies.append(None)
+            answered.append(i)
+
+    with span('state_write'):
+        outcomes, state = await mutate_game_state(room_id, lambda current: plan_drawings(current, [answers[drawings[i].digest][0] for i in answered]))
+    for i, (outcome, after) in zip(answered, outcomes):
+        category, response = answers[drawings[i].digest]
+        replies[i] = compose_reply(response, outcome, category, after)
+        ARCHIVER.submit(
+            room_id, drawings[i], replies[i],
+            stage=int(stage), category=category.name if category else None, outcome=outcome.value,
+            source=unique[drawings[i].digest].answered_by, latency=round(latency, 4),
+        )
+    return {'responses': replies, **data_payload(state)['puzzle_1b']}
+
+@app.post('/chatbot/stream')
+async def chatbot_stream(request: Request, authorization: Optional[str] = Header(None)):
+    """
+    /chatbot as Server-Sent Events: `text` events carry the reply as the model writes it, then one `done` event
+    the complete reply (with the game-progress message) and the puzzle counts, or an `error` event
+    """
+    room_id, state = validate_session_token(authorization)
+    drawing = await read_drawing(request)
+    # As for /chatbot, and on the same flights: a repeated submit follows the classification already running for this
+    # drawing, within the session's cap
+    try:
+        events = CHATBOT_FLIGHTS.stream(
+            authorization.split(' ')[1], drawing.digest, lambda: drawing_reply_stream(room_id, state, drawing),
+            from_result=lambda reply: stream_from_reply(room_id, reply),
+        )
+    except FlightLimitReached:
+        events = still_thinking_stream(state)
+    return StreamingResponse(
+        (sse_event(event, data) async for event, data in events),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+async def still_thinking_stream(state: Dict[str, Any]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    yield 'done', {'response': still_thinking_reply(), **data_payload(state)['puzzle_1b']}
+
+async def reply_from_stream(events: AsyncIterator[Tuple[str, Dict[str, Any]]]) -> str:
+    """A /chatbot/stream flight joined from /chatbot: the reply of its `done` event, or its `error` as an HTTP error"""
+    async for event, data in events:
+        if event == 'done':
+            return data['response']
+        if event == 'error':
+            if data.get('retry_after'):
+                raise HTTPException(status_code=503, detail=data['detail'], headers={'Retry-After': str(data['retry_after'])})
+            raise HTTPException(status_code=500, detail=data['detail'])
+    raise HTTPException(status_code=500, detail='Treasure Guardian got confused, please try again')
+
+async def stream_from_reply(room_id: str, reply: Awaitable[str]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """A /chatbot flight joined from /chatbot/stream: its reply as a single `done` event, or an `error` event"""
+    try:
+        response = await reply
+    except ModelUnavailable as e:
+        response = e.reply
+    except HTTPException as e:
+        yield 'error', {'detail': e.detail, **({'retry_after': 5} if e.status_code == 503 else {})}
+        return
+    except Exception:
+        yield 'error', {'detail': 'Treasure Guardian got confused, please try again'}
+        return
+    yield 'done', {'response': response, **data_payload(get_game_state(room_id))['puzzle_1b']}
+
+async def drawing_reply_stream(room_id: str, state: Dict[str, Any], drawing: Drawing) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    stage = state['puzzle_1b']['completed_stage']
+    start = time.perf_counter()
+    streaming = True
+    try:
+        async for kind, value in chatbot_pipeline_stream(drawing, completed_stage=stage):
+            if kind == 'category':
+                # Previewed on the state the request started with; a reply that will not open the final message
+                # (solving stage 2 answers with the PIN alone) is held back, the `done` event is authoritative either way
+                outcome, _ = plan_drawing(state, value)
+                streaming = reply_starts_with_response(outcome)
+            elif kind == 'text' and streaming:
+                yield 'text', {'text': value}
+            elif kind == 'result':
+                category, response = value
+    except GovernorBusy:
+        yield 'error', {'detail': 'Treasure Guardian is busy, please try again', 'retry_after': 5}
+        return
+    except ModelUnavailable as e:
+        yield 'done', {'response': e.reply, **data_payload(state)['puzzle_1b']}
+        return
+    except Exception as e:
+        # The response has started, so the client can only learn of a failure from the stream itself
+        logging.exception(f'Streamed reply for room {room_id} failed: {e!r}')
+        yield 'error', {'detail': 'Treasure Guardian got confused, please try again'}
+        return
+    try:
+        response, state = await commit_drawing(room_id, stage, drawing, category, response, time.perf_counter() - start)
+    except HTTPException as e:
+        yield 'error', {'detail': e.detail}
+        return
+    except Exception as e:
+        logging.exception(f'Applying a streamed drawing for room {room_id} failed: {e!r}')
+        yield 'error', {'detail': 'Treasure Guardian got confused, please try again'}
+        return
+    yield 'done', {'response': response, **data_payload(state)['puzzle_1b']}
+
 @app.get('/admin')
-async def get_admin_state(authorization: Optional[str] = Header(None)):
+async def get_admin_state(response: Response, room: Optional[str] = None, authorization: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
+    validate_admin_passphrase(authorization)
+    state = get_game_state(validate_room_id(room))
+    etag = state_etag(state)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return state
+
+@app.get('/admin/rooms')
+async def list_rooms(authorization: Optional[str] = Header(None)):
     validate_admin_passphrase(authorization)
-    return STATE
+    return [room_summary(room_id, state) for room_id, state in STORE.rooms()]
 
 @app.post("/admin")
-async def update_admin_state(update: AdminUpdate, authorization: Optional[str] = Header(None)):
+async def update_admin_state(update: AdminUpdate, room: Optional[str] = None, authorization: Optional[str] = Header(None)):
     validate_admin_passphrase(authorization)
+    room_id = validate_room_id(room)
+    get_game_state(room_id)
     try:
+        state_update = StateUpdate()
         if update.target_time is not None:
             datetime.fromisoformat(update.target_time)
-            STATE['target_time'] = update.target_time
+            state_update.set['target_time'] = update.target_time
         if update.hints is not None:
             if not isinstance(update.hints, list):
                 raise ValueError("hints must be a list")
-            STATE['hints'] = update.hints
+            state_update.set['hints'] = update.hints
         if update.passphrase is not None:
             if not isinstance(update.passphrase, str):
                 raise ValueError("passphrase must be a string")
-            STATE['master_codes']['passphrase'] = update.passphrase
+            state_update.set['master_codes.passphrase'] = update.passphrase
         if update.puzzle_1b_pins is not None:
             if not isinstance(update.puzzle_1b_pins, list):
                 raise ValueError("puzzle_1b_pins must be a list")
-            STATE['master_codes']['puzzle_1b_pins'] = update.puzzle_1b_pins
-        return STATE
+            state_update.set['master_codes.puzzle_1b_pins'] = update.puzzle_1b_pins
+        state = update_game_state(room_id, state_update)
+        if state is None:
+            raise HTTPException(status_code=404, detail=f'Room {room_id} not found')
+        return state
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
     
 @app.post("/reset")
-async def reset_admin_state(authorization: Optional[str] = Header(None)):
+async def reset_admin_state(room: Optional[str] = None, authorization: Optional[str] = Header(None)):
+    # Also creates the room if it does not exist yet
     validate_admin_passphrase(authorization)
-    return reset_game_state()
+    room_id = validate_room_id(room)
+    state = reset_game_state()
+    STORE.create(room_id, state, replace=True)
+    get_broadcaster(room_id).publish(state)
+    return state
 
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    if UVICORN_WORKERS > 1:
+        # Workers only agree on the game state through a shared store
+        if not STORE.shared:
+            raise SystemExit('UVICORN_WORKERS > 1 needs a shared STATE_STORE (sqlite or dynamodb)')
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=UVICORN_WORKERS)
+    else:
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,111 @@
+"""
+Prompt regression check: re-classify archived drawings with the current prompt settings
+(LLM_MODEL, LLM_STRUCTURED_OUTPUT) and compare with the categories
+they were given when played, along with tokens and latency per call. Gemini is called directly,
+without the pre-filter, cache or cassette, so it needs GOOGLE_API_KEY.
+
+    python prompt_check.py --dir ./archive --room default --limit 200
+    LLM_STRUCTURED_OUTPUT=json_schema python prompt_check.py --bucket my-bucket --date 2026-10-17 --json
+"""
+import argparse, asyncio, json, logging, sys, time
+import numpy as np
+from collections import Counter
+from typing import Any, Dict, List
+
+from components.envfile import load_env_file
+load_env_file()
+
+from components.archive import LocalSink, S3Sink, read_manifest
+from components.chatbot import STAGES, _build_request, _parse_response, warm_classifiers
+from components.imaging import prepare_drawing_bytes
+from components.metrics import llm_usage_counts
+
+
+async def classify_record(sink: Any, record: Dict[str, Any], slots: asyncio.Semaphore) -> Dict[str, Any]:
+    stage = int(record['stage'])
+    drawing = prepare_drawing_bytes(await asyncio.to_thread(sink.get, record['key']))
+    classifier, messages, none_category = _build_request(drawing, stage)
+    async with slots:
+        start = time.perf_counter()
+        output = await classifier.ainvoke(messages)
+        latency = time.perf_counter() - start
+    category, _ = _parse_response(output, none_category, stage)
+    return {
+        'stage': stage,
+        'was': record.get('category') or 'NONE',
+        'now': category.name if category else 'NONE',
+        'latency': latency,
+        **llm_usage_counts(getattr(output['raw'], 'usage_metadata', None)),
+    }
+
+
+def build_report(results: List[Dict[str, Any]], errors: int) -> Dict[str, Any]:
+    if not results:
+        return {'checked': 0, 'errors': errors}
+    same = np.array([r['was'] == r['now'] for r in results])
+    stage = np.array([r['stage'] for r in results])
+    latency = np.array([r['latency'] for r in results])
+    return {
+        'checked': len(results),
+        'errors': errors,
+        'agreement': round(float(same.mean()), 4),
+        'agreement_by_stage': {int(s): round(float(same[stage == s].mean()), 4) for s in np.unique(stage)},
+        'changed': dict(Counter(f"{r['was']} -> {r['now']}" for r in results if r['was'] != r['now']).most_common()),
+        'tokens_per_call': {kind: round(float(np.mean([r.get(kind, 0) for r in results])), 1) for kind in ('input', 'cached', 'output', 'reasoning')},
+        'latency': {f'p{p}': round(float(v), 4) for p, v in zip((50, 95), np.percentile(latency, (50, 95)))},
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{report['checked']} drawings re-classified, {report['errors']} failed")
+    if not report['checked']:
+        return
+    print(f"  same category {report['agreement']:.1%}, by stage {report['agreement_by_stage']}")
+    print(f"  tokens per call {report['tokens_per_call']}, latency {report['latency']}")
+    for change, n in report['changed'].items():
+        print(f'  {change:<24} {n:>5}')
+
+
+async def run(sink: Any, records: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    warm_classifiers()
+    slots = asyncio.Semaphore(concurrency)
+    outcomes = await asyncio.gather(*(classify_record(sink, r, slots) for r in records), return_exceptions=True)
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            logging.warning(f'Could not re-classify a drawing: {outcome!r}')
+    return build_report([o for o in outcomes if not isinstance(o, BaseException)], sum(isinstance(o, BaseException) for o in outcomes))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Re-classify archived drawings with the current prompt and compare categories')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--dir', help='local archive directory (ARCHIVE_DIR)')
+    source.add_argument('--bucket', help='S3 bucket (S3_BUCKET_NAME)')
+    parser.add_argument('--room', action='append', help='room to take drawings from, repeatable (default: default)')
+    parser.add_argument('--date', help='only this date, YYYY-MM-DD')
+    parser.add_argument('--limit', type=int, default=100, help='most recent drawings to check')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--json', action='store_true', help='print JSON instead of a summary')
+    args = parser.parse_args(argv)
+
+    if args.dir:
+        sink = LocalSink(args.dir)
+    else:
+        import boto3
+        sink = S3Sink(args.bucket, lambda: boto3.client('s3'))
+
+    records = [
+        r for room in (args.room or ['default']) for r in read_manifest(sink, room, args.date)
+        if r.get('key') and r.get('stage') in STAGES
+    ]
+    records = sorted(records, key=lambda r: r['timestamp'])[-args.limit:]
+    report = asyncio.run(run(sink, records, args.concurrency))
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Cold start benchmark: import time of the app module (with the slowest imports) and the
+wall time from launching uvicorn to the first successful /health, each in a fresh process.
+
+    python startup_benchmark.py --app main --runs 5
+    python startup_benchmark.py --app main_lambda --runs 5 --json startup.json   # needs AWS credentials and region
+"""
+import argparse, json, os, statistics, subprocess, sys, time, urllib.request
+from typing import Any, Dict, List, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure_import(app: str) -> Tuple[float, List[Tuple[str, float]]]:
+    """Seconds to import the module, plus its slowest direct imports by cumulative import time"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {app}'],
+        cwd=HERE, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'import {app} failed:\n{result.stderr[-2000:]}')
+    packages: Dict[str, float] = {}
+    total = 0.0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        seconds = int(cumulative) / 1e6
+        depth = (len(name) - len(name.lstrip())) // 2  # one level of nesting per two spaces
+        if depth == 1:  # imported directly by the app module
+            packages[name.strip()] = seconds
+        elif depth == 0 and name.strip() == app:
+            total = seconds
+    return total, sorted(packages.items(), key=lambda kv: -kv[1])
+
+
+def measure_first_health(app: str, port: int, timeout: float) -> float:
+    """Seconds from spawning uvicorn until /health answers 200"""
+    url = f'http://127.0.0.1:{port}/health'
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', f'{app}:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f'uvicorn exited early:\n{server.stderr.read().decode()[-2000:]}')
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f'/health did not answer within {timeout}s')
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def summary(values: List[float]) -> Dict[str, float]:
+    return {
+        'median': round(statistics.median(values), 4),
+        'min': round(min(values), 4),
+        'max': round(max(values), 4),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure import time and time to first /health')
+    parser.add_argument('--app', default='main', choices=['main', 'main_lambda'])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--top', type=int, default=8, help='slowest imports to list')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args(argv)
+
+    imports, health, packages = [], [], []
+    for run in range(args.runs):
+        seconds, packages = measure_import(args.app)
+        imports.append(seconds)
+        health.append(measure_first_health(args.app, args.port, args.timeout))
+        print(f'run {run + 1}: import {imports[-1]:.3f}s, first /health {health[-1]:.3f}s')
+
+    results: Dict[str, Any] = {
+        'app': args.app,
+        'runs': args.runs,
+        'import_seconds': summary(imports),
+        'first_health_seconds': summary(health),
+        'slowest_imports': [{'module': name, 'seconds': round(s, 4)} for name, s in packages[:args.top]],
+    }
+    print(f"import {results['import_seconds']}")
+    print(f"first /health {results['first_health_seconds']}")
+    print('slowest imports (last run):')
+    for row in results['slowest_imports']:
+        print(f"  {row['seconds']:>8.3f}s  {row['module']}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
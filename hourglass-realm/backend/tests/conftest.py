@@ -0,0 +1,4 @@
+import os, sys
+
+# The app imports its modules as `components.x` from the backend directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
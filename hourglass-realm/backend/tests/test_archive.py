@@ -0,0 +1,133 @@
+import asyncio, io
+from PIL import Image
+
+from archive_report import build_report
+from components.archive import ArchiveUploader, LocalSink, read_manifest
+from components.imaging import prepare_drawing_bytes
+
+
+def blank_drawing():
+    buffer = io.BytesIO()
+    Image.new('RGB', (30, 30), 'white').save(buffer, format='PNG')
+    return prepare_drawing_bytes(buffer.getvalue())
+
+
+def manifest_parts(sink):
+    return [key for key in sink.list('manifest/') if key.endswith('.jsonl')]
+
+
+class FlakySink(LocalSink):
+    def __init__(self, root):
+        super().__init__(root)
+        self.fail_manifest = True
+
+    def put(self, key, body, content_type=None):
+        if key.startswith('manifest/') and self.fail_manifest:
+            raise OSError('unavailable')
+        super().put(key, body, content_type)
+
+
+def test_manifest_parts_hold_a_batch_and_the_rest_is_flushed_on_stop(tmp_path):
+    sink = LocalSink(str(tmp_path))
+
+    async def scenario():
+        archiver = ArchiveUploader(sink, concurrency=1, manifest_batch=3, manifest_interval=3600)
+        archiver.start()
+        for i, source in enumerate(['model', 'cache', 'prefilter', 'model']):
+            assert archiver.submit('room-1', blank_drawing(), f'reply {i}', outcome='unrecognised', source=source)
+            await archiver._queue.join()
+        parts_before_stop = len(manifest_parts(sink))
+        await archiver.stop()
+        return parts_before_stop, archiver.stats()
+
+    parts_before_stop, stats = asyncio.run(scenario())
+    # One part for the first full batch while running, not one per submission
+    assert parts_before_stop == 1
+    assert len(manifest_parts(sink)) == 2 and stats['uploaded'] == 4 and stats['manifest_pending'] == 0
+    records = read_manifest(sink, 'room-1')
+    assert sorted(r['response'] for r in records) == ['reply 0', 'reply 1', 'reply 2', 'reply 3']
+    assert sorted(r['source'] for r in records) == ['cache', 'model', 'model', 'prefilter']
+
+
+def test_records_of_a_failed_manifest_write_are_kept_for_the_next_flush(tmp_path):
+    sink = FlakySink(str(tmp_path))
+
+    async def scenario():
+        archiver = ArchiveUploader(sink, concurrency=1, manifest_batch=1, manifest_interval=3600)
+        archiver.start()
+        archiver.submit('room-1', blank_drawing(), 'first', source='model')
+        await archiver._queue.join()
+        failures = archiver.stats()['manifest_failures']
+        sink.fail_manifest = False
+        await archiver.stop()
+        return failures
+
+    assert asyncio.run(scenario()) >= 1
+    assert [r['response'] for r in read_manifest(sink, 'room-1')] == ['first']
+
+
+def test_report_times_only_model_answers():
+    records = [
+        {'category': 'CAR', 'outcome': 'found', 'stage': 0, 'latency': 2.0, 'source': 'model'},
+        {'category': 'CAR', 'outcome': 'duplicate', 'stage': 0, 'latency': 0.01, 'source': 'cache'},
+        {'category': None, 'outcome': 'unrecognised', 'stage': 0, 'latency': 0.001, 'source': 'prefilter'},
+        {'category': 'HOUSE', 'outcome': 'found', 'stage': 0, 'latency': 4.0},
+    ]
+    report = build_report(records)
+    assert report['by_source'] == {'cache': 1, 'model': 2, 'prefilter': 1}
+    assert report['latency']['count'] == 2 and report['latency']['p50'] == 3.0
+    assert report['categories']['CAR']['latency']['count'] == 1
+
+
+def test_drawing_and_reply_are_archived_under_the_room_and_date(tmp_path):
+    sink = LocalSink(str(tmp_path))
+
+    async def scenario():
+        archiver = ArchiveUploader(sink, concurrency=2)
+        archiver.start()
+        archiver.submit('room-1', blank_drawing(), 'Nice!')
+        await archiver.stop()
+
+    asyncio.run(scenario())
+    keys = sink.list('archive/')
+    assert len(keys) == 2 and all(key.startswith('archive/room=room-1/date=') for key in keys)
+    response = next(key for key in keys if key.endswith('_response.txt'))
+    assert sink.get(response) == b'Nice!'
+
+
+def test_submissions_are_dropped_not_awaited_when_the_queue_is_full(tmp_path):
+    class SlowSink(LocalSink):
+        def put(self, key, body, content_type=None):
+            import time
+            time.sleep(0.05)
+            super().put(key, body, content_type)
+
+    async def scenario():
+        archiver = ArchiveUploader(SlowSink(str(tmp_path)), max_queue=1, concurrency=1)
+        archiver.start()
+        accepted = [archiver.submit('room-1', blank_drawing(), f'reply {i}') for i in range(3)]
+        await archiver.stop()
+        return accepted, archiver.stats()
+
+    accepted, stats = asyncio.run(scenario())
+    assert accepted == [True, False, False]
+    assert stats['dropped'] == 2 and stats['uploaded'] == 1
+
+
+def test_failed_uploads_are_counted_and_nothing_is_archived_without_a_sink(tmp_path):
+    class BrokenSink(LocalSink):
+        def put(self, key, body, content_type=None):
+            raise OSError('unavailable')
+
+    async def scenario():
+        broken = ArchiveUploader(BrokenSink(str(tmp_path)))
+        broken.start()
+        broken.submit('room-1', blank_drawing(), 'reply')
+        await broken.stop()
+        disabled = ArchiveUploader(None)
+        disabled.start()
+        return broken.stats(), disabled.submit('room-1', blank_drawing(), 'reply')
+
+    stats, accepted = asyncio.run(scenario())
+    assert stats['failed'] == 1 and stats['uploaded'] == 0 and stats['manifest_pending'] == 0
+    assert accepted is False
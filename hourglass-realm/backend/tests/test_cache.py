@@ -0,0 +1,116 @@
+import io
+from PIL import Image, ImageDraw
+
+from components.cache import ClassificationCache
+from components.imaging import hamming_distance, ink_hash, prepare_drawing_bytes
+
+
+def drawing(*shapes):
+    img = Image.new('RGB', (300, 300), 'white')
+    canvas = ImageDraw.Draw(img)
+    for shape in shapes:
+        shape(canvas)
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return prepare_drawing_bytes(buffer.getvalue())
+
+
+def circle(box=(80, 80, 220, 220)):
+    return lambda canvas: canvas.ellipse(box, outline='black', width=6)
+
+
+def dollar(canvas):
+    canvas.text((140, 135), '$', fill='black', font_size=40)
+
+
+def cross(canvas):
+    canvas.line((150, 60, 150, 240), fill='black', width=6)
+    canvas.line((90, 120, 210, 120), fill='black', width=6)
+
+
+def stick_figure(canvas):
+    canvas.ellipse((130, 50, 170, 90), outline='black', width=6)
+    cross(canvas)
+    canvas.line((150, 180, 110, 240), fill='black', width=6)
+    canvas.line((150, 180, 190, 240), fill='black', width=6)
+
+
+def fingerprint(d):
+    return d.digest, ink_hash(d.pixels, d.stats['bbox'])
+
+
+def test_ink_hash_ignores_position_and_size_but_not_detail():
+    def distance(a, b):
+        return hamming_distance(fingerprint(a)[1], fingerprint(b)[1])
+
+    assert distance(drawing(circle()), drawing(circle((120, 40, 260, 180)))) <= 2
+    assert distance(drawing(circle()), drawing(circle((40, 40, 260, 260)))) <= 8
+    assert distance(drawing(circle()), drawing(circle(), dollar)) > 8
+    assert distance(drawing(cross), drawing(stick_figure)) > 8
+
+
+def test_near_hit_for_the_same_shape_drawn_elsewhere():
+    cache = ClassificationCache()
+    cache.put(0, *fingerprint(drawing(circle())), 'not recognised')
+    assert cache.get(0, *fingerprint(drawing(circle((120, 40, 260, 180))))) == 'not recognised'
+    assert cache.get(1, *fingerprint(drawing(circle((120, 40, 260, 180))))) is None
+    assert cache.stats()['near_hits'] == 1
+
+
+def test_miss_for_a_different_drawing():
+    cache = ClassificationCache()
+    cache.put(0, *fingerprint(drawing(circle())), 'not recognised')
+    cache.put(0, *fingerprint(drawing(cross)), 'not recognised')
+    assert cache.get(0, *fingerprint(drawing(circle(), dollar))) is None
+    assert cache.get(0, *fingerprint(drawing(stick_figure))) is None
+    assert cache.stats()['misses'] == 2
+
+
+def test_results_put_without_near_need_the_exact_drawing():
+    cache = ClassificationCache()
+    money = drawing(circle(), dollar)
+    cache.put(0, *fingerprint(money), 'MONEY', near=False)
+    assert cache.get(0, *fingerprint(drawing(circle(), dollar))) == 'MONEY'
+    assert cache.get(0, *fingerprint(drawing(circle((79, 80, 219, 220)), lambda canvas: canvas.text((139, 135), '$', fill='black', font_size=40)))) is None
+
+
+def test_only_unrecognised_answers_are_lent_to_similar_drawings():
+    from components.chatbot import CLASSIFICATION_CACHE, ObjectCategory1, _cache_result
+
+    CLASSIFICATION_CACHE.clear()
+    try:
+        _cache_result(0, fingerprint(drawing(cross)), (ObjectCategory1.NONE, 'What is that?'))
+        _cache_result(0, fingerprint(drawing(circle(), dollar)), (ObjectCategory1.MONEY, 'Riches!'))
+        redrawn_cross = drawing(lambda canvas: canvas.line((151, 60, 151, 240), fill='black', width=6), lambda canvas: canvas.line((90, 121, 210, 121), fill='black', width=6))
+        redrawn_money = drawing(circle((60, 60, 200, 200)), lambda canvas: canvas.text((120, 115), '$', fill='black', font_size=40))
+        assert CLASSIFICATION_CACHE.get(0, *fingerprint(redrawn_cross)) == (ObjectCategory1.NONE, 'What is that?')
+        assert CLASSIFICATION_CACHE.get(0, *fingerprint(redrawn_money)) is None
+    finally:
+        CLASSIFICATION_CACHE.clear()
+
+
+def test_least_recently_used_entries_are_evicted_first():
+    cache = ClassificationCache(max_entries=2, max_distance=0)
+    cache.put(0, 'a', 1, 'A')
+    cache.put(0, 'b', 2, 'B')
+    assert cache.get(0, 'a', 1) == 'A'
+    cache.put(0, 'c', 3, 'C')
+    assert cache.get(0, 'b', 2) is None
+    assert cache.get(0, 'a', 1) == 'A' and cache.get(0, 'c', 3) == 'C'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_expired_entries_are_not_served(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('components.cache.time.monotonic', lambda: now[0])
+    cache = ClassificationCache(ttl=10)
+    cache.put(0, 'a', 1, 'A')
+    now[0] += 11
+    assert cache.get(0, 'a', 1) is None
+    assert cache.stats()['expirations'] == 1 and cache.stats()['entries'] == 0
+
+
+def test_disabled_cache_stores_nothing():
+    cache = ClassificationCache(max_entries=0)
+    cache.put(0, 'a', 1, 'A')
+    assert not cache.enabled and cache.get(0, 'a', 1) is None
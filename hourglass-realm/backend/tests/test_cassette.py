@@ -0,0 +1,85 @@
+import asyncio, io
+import pytest
+from PIL import Image, ImageDraw
+
+from components import chatbot
+from components.cache import ClassificationCache
+from components.cassette import Cassette, CassetteMiss
+from components.imaging import prepare_drawing_bytes
+
+
+def drawing(box):
+    img = Image.new('RGB', (300, 300), 'white')
+    ImageDraw.Draw(img).ellipse(box, outline='black', width=6)
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return prepare_drawing_bytes(buffer.getvalue())
+
+
+@pytest.fixture
+def replay(tmp_path, monkeypatch):
+    recorder = Cassette(str(tmp_path / 'cassette.jsonl'), mode='record')
+    recorder.record(0, *chatbot._fingerprint(drawing((80, 80, 220, 220))), 'CAR', 'Vroom!', 0.5)
+    cassette = Cassette(recorder.path, mode='replay', time_scale=0)
+    monkeypatch.setattr(chatbot, 'CHATBOT_CASSETTE', cassette)
+    monkeypatch.setattr(chatbot, 'CLASSIFICATION_CACHE', ClassificationCache(max_entries=0))
+    return cassette
+
+
+def test_recorded_answers_are_replayed(replay):
+    category, response = asyncio.run(chatbot.chatbot_pipeline_async(drawing((80, 80, 220, 220)), completed_stage=0))
+    assert (category, response) == (chatbot.ObjectCategory1.CAR, 'Vroom!')
+    assert replay.stats()['replayed'] == 1
+
+
+def test_strict_replay_miss_fails_instead_of_falling_back(replay):
+    before = chatbot.LLM_BREAKER.stats()['consecutive_failures']
+    with pytest.raises(CassetteMiss):
+        asyncio.run(chatbot.chatbot_pipeline_async(drawing((20, 100, 280, 200)), completed_stage=0))
+    assert replay.stats()['misses'] == 1
+    assert chatbot.LLM_BREAKER.stats()['consecutive_failures'] == before
+
+
+def test_streamed_replay_checks_the_drawing_locally_once(replay, monkeypatch):
+    cache = ClassificationCache()
+    monkeypatch.setattr(chatbot, 'CLASSIFICATION_CACHE', cache)
+    checked = chatbot.PREFILTER_STATS['checked']
+
+    async def collect():
+        return [item async for item in chatbot.chatbot_pipeline_stream(drawing((80, 80, 220, 220)), completed_stage=0)]
+
+    items = asyncio.run(collect())
+    assert items[-1] == ('result', (chatbot.ObjectCategory1.CAR, 'Vroom!'))
+    assert chatbot.PREFILTER_STATS['checked'] == checked + 1
+    assert cache.stats()['misses'] == 1 and cache.stats()['entries'] == 1
+
+
+def test_replay_cycles_recordings_and_falls_back_to_near_hashes(tmp_path):
+    recorder = Cassette(str(tmp_path / 'cassette.jsonl'), mode='record')
+    recorder.record(0, 'digest-a', 0b1111, 'CAR', 'first', 1.0, {'input_tokens': 400, 'output_tokens': 40})
+    recorder.record(0, 'digest-a', 0b1111, 'CAR', 'second', 2.0)
+    cassette = Cassette(recorder.path, mode='replay', time_scale=0.5, max_distance=1)
+    plays = [cassette.replay(0, 'digest-a', 0b1111) for _ in range(3)]
+    assert [(entry['response'], delay) for entry, delay in plays] == [('first', 0.5), ('second', 1.0), ('first', 0.5)]
+    assert plays[0][0]['input_tokens'] == 400 and plays[0][0]['category'] == 'CAR'
+    entry, _ = cassette.replay(0, 'digest-b', 0b1110)
+    assert entry['digest'] == 'digest-a' and cassette.stats()['near_hits'] == 1
+    with pytest.raises(CassetteMiss):
+        cassette.replay(0, 'digest-c', 0b0000)
+    with pytest.raises(CassetteMiss):
+        cassette.replay(1, 'digest-a', 0b1111)
+
+
+def test_lenient_replay_serves_a_recording_of_the_same_stage(tmp_path):
+    recorder = Cassette(str(tmp_path / 'cassette.jsonl'), mode='record')
+    recorder.record(0, 'digest-a', 0b1111, None, 'What is that?', 1.0)
+    cassette = Cassette(recorder.path, mode='replay', strict=False, max_distance=0)
+    entry, _ = cassette.replay(0, 'synthetic', 0)
+    assert entry['response'] == 'What is that?' and cassette.stats()['fallbacks'] == 1
+    with pytest.raises(CassetteMiss):
+        cassette.replay(1, 'synthetic', 0)
+
+
+def test_unknown_modes_are_rejected():
+    with pytest.raises(ValueError):
+        Cassette('cassette.jsonl', mode='rewind')
@@ -0,0 +1,19 @@
+import os, subprocess, sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_env_file_settings_reach_the_components(tmp_path):
+    env_file = tmp_path / '.env'
+    env_file.write_text('MAX_UPLOAD_BYTES = "1234"\nLLM_MAX_CONCURRENCY = "3"\n')
+    env = {k: v for k, v in os.environ.items() if k not in ('MAX_UPLOAD_BYTES', 'LLM_MAX_CONCURRENCY')}
+    env['ENV_FILE'] = str(env_file)
+    script = (
+        'import main\n'
+        'from components import uploads\n'
+        'from components.chatbot import LLM_GOVERNOR\n'
+        'print(uploads.MAX_UPLOAD_BYTES, LLM_GOVERNOR.stats()["limit"])\n'
+    )
+    result = subprocess.run([sys.executable, '-c', script], cwd=BACKEND, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split()[-2:] == ['1234', '3']
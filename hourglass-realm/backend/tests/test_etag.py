@@ -0,0 +1,37 @@
+from components.etag import etag_matches, state_etag
+
+
+def test_etag_changes_with_the_version_and_across_resets():
+    state = {'version': 3, 'created_at': '2026-10-17T20:00:00+00:00'}
+    assert state_etag(state) == '"3-2026-10-17T20:00:00+00:00"'
+    assert state_etag({**state, 'version': 4}) != state_etag(state)
+    assert state_etag({**state, 'created_at': '2026-10-17T21:00:00+00:00'}) != state_etag(state)
+
+
+def test_if_none_match_lists_weak_tags_and_wildcards():
+    etag = '"3-x"'
+    assert etag_matches('"3-x"', etag)
+    assert etag_matches('"2-x", W/"3-x"', etag)
+    assert etag_matches('*', etag)
+    assert not etag_matches('"2-x"', etag)
+    assert not etag_matches(None, etag) and not etag_matches('', etag)
+
+
+def test_data_is_not_modified_until_the_state_changes():
+    import asyncio, httpx, main
+    from components.updates import StateUpdate
+
+    async def scenario():
+        async with main.app.router.lifespan_context(main.app):
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url='http://test') as client:
+                token = (await client.post('/enter', params={'room': 'default'})).json()['portalToken']
+                auth = {'Authorization': f'Bearer {token}'}
+                first = await client.get('/data', headers=auth)
+                again = await client.get('/data', headers={**auth, 'If-None-Match': first.headers['ETag']})
+                main.update_game_state('default', StateUpdate(set={'hints': ['look under the table']}))
+                changed = await client.get('/data', headers={**auth, 'If-None-Match': first.headers['ETag']})
+                return first, again, changed
+
+    first, again, changed = asyncio.run(scenario())
+    assert first.status_code == 200 and again.status_code == 304 and again.content == b''
+    assert changed.status_code == 200 and changed.headers['ETag'] != first.headers['ETag']
@@ -0,0 +1,61 @@
+import asyncio, json
+
+from components.events import StateBroadcaster, game_event_stream, sse_event
+
+
+def state(count, token='t1'):
+    return {'active_token': token, 'count': count, 'version': count}
+
+
+def payload(s):
+    return {'count': s['count']}
+
+
+def test_stream_sends_changes_pings_and_expiry():
+    async def scenario():
+        broadcaster = StateBroadcaster()
+        broadcaster.publish(state(0))
+        events = game_event_stream(broadcaster, 't1', payload, heartbeat=0.05)
+        received = [await events.__anext__(), await events.__anext__()]
+        broadcaster.publish({**state(0), 'version': 1})  # nothing the portal shows changed
+        broadcaster.publish(state(1))
+        received.append(await events.__anext__())
+        received.append(await events.__anext__())
+        broadcaster.publish(state(1, token='t2'))
+        received.append(await events.__anext__())
+        received += [event async for event in events]
+        return received, broadcaster.subscribers
+
+    received, subscribers = asyncio.run(scenario())
+    assert received[0] == 'retry: 3000\n\n'
+    assert received[1] == f'data: {json.dumps({"count": 0})}\n\n'
+    assert received[2] == f'data: {json.dumps({"count": 1})}\n\n'
+    assert received[3] == ': ping\n\n'
+    assert received[4:] == ['event: expired\ndata: {}\n\n']
+    assert subscribers == 0
+
+
+def test_broadcaster_polls_for_changes_from_other_processes_while_subscribed():
+    async def scenario():
+        polled = []
+
+        def poll(last):
+            polled.append(last)
+            return state(len(polled))
+
+        broadcaster = StateBroadcaster(poll=poll, interval=0.01)
+        updates = broadcaster.subscribe(heartbeat=1)
+        assert await updates.__anext__() is None
+        first = await updates.__anext__()
+        await updates.aclose()
+        await asyncio.sleep(0.05)
+        return first, polled, broadcaster._poller
+
+    first, polled, poller = asyncio.run(scenario())
+    assert first['count'] >= 1 and polled[0] is None
+    assert poller is None
+
+
+def test_sse_event_keeps_a_multiline_payload_on_one_data_line():
+    event = sse_event('text', {'text': 'two\nlines é'})
+    assert event == 'event: text\ndata: {"text": "two\\nlines é"}\n\n'
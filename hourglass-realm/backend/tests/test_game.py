@@ -0,0 +1,112 @@
+import copy
+
+from components.chatbot import ObjectCategory1, ObjectCategory2
+from components.game import STAGE1_TARGETS, DrawingOutcome, compose_reply, plan_drawing, plan_drawings
+
+
+def make_state(found=(), completed_stage=0):
+    return {
+        'puzzle_1b': {
+            'stage1_progress': {t: t in found for t in STAGE1_TARGETS},
+            'stage1_count': len(found),
+            'completed_stage': completed_stage,
+            'pins': ['111'] if completed_stage >= 1 else [],
+        },
+        'master_codes': {'puzzle_1b_pins': ['111', '222']},
+    }
+
+
+def test_unrecognised_and_non_target_drawings_leave_the_state_alone():
+    assert plan_drawing(make_state(), None) == (DrawingOutcome.UNRECOGNISED, None)
+    assert plan_drawing(make_state(), ObjectCategory1.NONE) == (DrawingOutcome.UNRECOGNISED, None)
+
+
+def test_found_target_sets_its_flag_and_adds_to_the_count():
+    state = make_state(found=['LOVE'])
+    outcome, update = plan_drawing(state, ObjectCategory1.CAR)
+    assert outcome == DrawingOutcome.FOUND
+    assert update.set == {'puzzle_1b.stage1_progress.CAR': True}
+    assert update.add == {'puzzle_1b.stage1_count': 1}
+    assert update.expect == {'puzzle_1b.completed_stage': 0, 'puzzle_1b.stage1_progress.CAR': False, 'puzzle_1b.stage1_count': ('<', 4)}
+    assert update.apply(state)
+    assert state['puzzle_1b']['stage1_count'] == 2
+    assert plan_drawing(state, ObjectCategory1.CAR) == (DrawingOutcome.DUPLICATE, None)
+
+
+def test_concurrent_finds_of_different_targets_both_apply():
+    state = make_state()
+    _, car = plan_drawing(state, ObjectCategory1.CAR)
+    _, house = plan_drawing(state, ObjectCategory1.HOUSE)
+    assert car.apply(state) and house.apply(state)
+    assert state['puzzle_1b']['stage1_count'] == 2
+
+
+def test_concurrent_finds_of_the_last_two_targets_conflict_so_completion_is_replanned():
+    state = make_state(found=['CAR', 'HOUSE', 'LOVE'])
+    _, money = plan_drawing(state, ObjectCategory1.MONEY)
+    _, family = plan_drawing(state, ObjectCategory1.FAMILY)
+    assert money.apply(state)
+    assert not family.apply(state)
+    outcome, family = plan_drawing(state, ObjectCategory1.FAMILY)
+    assert outcome == DrawingOutcome.STAGE1_COMPLETE
+    assert family.apply(state)
+    assert state['puzzle_1b']['completed_stage'] == 1 and state['puzzle_1b']['pins'] == ['111']
+
+
+def test_fifth_target_completes_stage_1_and_awards_the_first_pin():
+    state = make_state(found=['CAR', 'HOUSE', 'LOVE', 'MONEY'])
+    outcome, update = plan_drawing(state, ObjectCategory1.FAMILY)
+    assert outcome == DrawingOutcome.STAGE1_COMPLETE
+    assert update.append == {'puzzle_1b.pins': '111'}
+    assert update.expect['puzzle_1b.stage1_count'] == 4
+    assert update.apply(state)
+    assert state['puzzle_1b']['stage1_count'] == 5 and state['puzzle_1b']['completed_stage'] == 1
+
+
+def test_stage_2_awards_the_true_pin_only_for_jesus():
+    state = make_state(found=STAGE1_TARGETS, completed_stage=1)
+    assert plan_drawing(state, ObjectCategory2.CAR) == (DrawingOutcome.ALREADY_PINNED, None)
+    outcome, update = plan_drawing(state, ObjectCategory2.JESUS)
+    assert outcome == DrawingOutcome.STAGE2_COMPLETE
+    assert update.expect == {'puzzle_1b.completed_stage': 1}
+    assert update.apply(state)
+    assert state['puzzle_1b']['pins'] == ['111', '222'] and state['puzzle_1b']['completed_stage'] == 2
+    assert plan_drawing(state, ObjectCategory2.JESUS) == (DrawingOutcome.FINISHED, None)
+
+
+def test_plan_drawings_matches_submitting_one_after_another():
+    categories = [ObjectCategory1.CAR, None, ObjectCategory1.HOUSE, ObjectCategory1.CAR, ObjectCategory1.MONEY, ObjectCategory1.FAMILY]
+    state = make_state(found=['LOVE'])
+    outcomes, update = plan_drawings(state, categories)
+    assert [(o, after['puzzle_1b']['stage1_count']) for o, after in outcomes] == [
+        (DrawingOutcome.FOUND, 2),
+        (DrawingOutcome.UNRECOGNISED, 2),
+        (DrawingOutcome.FOUND, 3),
+        (DrawingOutcome.DUPLICATE, 3),
+        (DrawingOutcome.FOUND, 4),
+        (DrawingOutcome.STAGE1_COMPLETE, 5),
+    ]
+
+    sequential = copy.deepcopy(state)
+    for category in categories:
+        _, single = plan_drawing(sequential, category)
+        if single is not None:
+            assert single.apply(sequential)
+    batched = copy.deepcopy(state)
+    assert update.apply(batched)
+    assert batched == sequential
+    assert 'only 3 more' in compose_reply('hi', outcomes[0][0], ObjectCategory1.CAR, outcomes[0][1])
+
+
+def test_plan_drawings_is_conditional_on_the_state_it_was_planned_on():
+    state = make_state()
+    _, update = plan_drawings(state, [ObjectCategory1.CAR, ObjectCategory1.HOUSE])
+    _, other = plan_drawing(state, ObjectCategory1.LOVE)
+    assert other.apply(state)
+    assert not update.apply(state)
+
+
+def test_plan_drawings_without_changes_has_no_update():
+    outcomes, update = plan_drawings(make_state(found=['CAR']), [None, ObjectCategory1.CAR])
+    assert [o for o, _ in outcomes] == [DrawingOutcome.UNRECOGNISED, DrawingOutcome.DUPLICATE]
+    assert update is None
@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+
+from components.governor import ConcurrencyGovernor, GovernorBusy
+
+
+def test_waiting_for_a_slot_is_bounded_by_the_timeout():
+    async def scenario():
+        governor = ConcurrencyGovernor('test', limit=1)
+        async with governor.slot():
+            with pytest.raises(asyncio.TimeoutError):
+                async with governor.slot(timeout=0.01):
+                    pass
+        async with governor.slot(timeout=0.01):
+            return governor.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats['queue_depth'] == 0 and stats['in_flight'] == 1 and stats['total_calls'] == 2
+
+
+def test_no_more_than_limit_calls_run_at_once():
+    async def scenario():
+        governor = ConcurrencyGovernor('test', limit=2)
+        running, peak = 0, 0
+
+        async def call():
+            nonlocal running, peak
+            async with governor.slot():
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(call() for _ in range(6)))
+        return peak, governor.stats()
+
+    peak, stats = asyncio.run(scenario())
+    assert peak == 2
+    assert stats['total_calls'] == 6 and stats['in_flight'] == 0 and stats['max_wait_seconds'] > 0
+
+
+def test_callers_beyond_the_queue_limit_are_turned_away():
+    async def scenario():
+        governor = ConcurrencyGovernor('test', limit=1, max_queue=1)
+        release = asyncio.Event()
+
+        async def call():
+            async with governor.slot():
+                await release.wait()
+
+        holder = asyncio.ensure_future(call())
+        queued = asyncio.ensure_future(call())
+        await asyncio.sleep(0)
+        with pytest.raises(GovernorBusy):
+            async with governor.slot():
+                pass
+        release.set()
+        await asyncio.gather(holder, queued)
+        return governor.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats['rejected'] == 1 and stats['total_calls'] == 2
@@ -0,0 +1,46 @@
+import base64, io
+import pytest
+from PIL import Image, ImageDraw
+
+from components import imaging
+from components.imaging import DrawingTooLarge, prepare_drawing, prepare_drawing_bytes
+
+
+def encoded(fmt='PNG', size=(300, 300)):
+    img = Image.new('RGB', size, 'white')
+    ImageDraw.Draw(img).rectangle((100, 120, 160, 200), outline='black', width=4)
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def test_digest_depends_on_the_pixels_not_the_encoding():
+    png, bmp = prepare_drawing_bytes(encoded('PNG')), prepare_drawing_bytes(encoded('BMP'))
+    assert (png.raw_format, bmp.raw_format) == ('png', 'bmp')
+    assert png.digest == bmp.digest
+
+
+def test_normalized_image_is_the_cropped_ink_in_grayscale():
+    d = prepare_drawing_bytes(encoded())
+    assert d.stats['bbox'] == (100, 120, 161, 201)
+    with Image.open(io.BytesIO(d.normalized_bytes)) as normalized:
+        margin = imaging.NORMALIZE_MARGIN
+        assert normalized.mode == 'L' and normalized.size == (61 + 2 * margin, 81 + 2 * margin)
+    assert len(d.normalized_bytes) < len(d.raw_bytes)
+    assert d.data_url.startswith('data:image/png;base64,')
+
+
+def test_data_urls_and_binary_uploads_give_the_same_drawing():
+    raw = encoded()
+    from_url = prepare_drawing('data:image/png;base64,' + base64.b64encode(raw).decode())
+    assert from_url.digest == prepare_drawing_bytes(raw).digest
+    with pytest.raises(ValueError):
+        prepare_drawing('not a data url')
+
+
+def test_oversized_and_undecodable_images_are_rejected(monkeypatch):
+    monkeypatch.setattr(imaging, 'MAX_DRAWING_PIXELS', 300 * 300 - 1)
+    with pytest.raises(DrawingTooLarge):
+        prepare_drawing_bytes(encoded())
+    with pytest.raises(ValueError):
+        prepare_drawing_bytes(b'not an image')
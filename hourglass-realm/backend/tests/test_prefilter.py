@@ -0,0 +1,40 @@
+import io
+from PIL import Image, ImageDraw
+
+from components.chatbot import PREFILTER_REPLIES, PREFILTER_STATS, prefilter_drawing
+from components.imaging import count_strokes, ink_mask, prepare_drawing_bytes
+
+
+def drawing(*shapes):
+    img = Image.new('RGB', (300, 300), 'white')
+    canvas = ImageDraw.Draw(img)
+    for shape in shapes:
+        shape(canvas)
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return prepare_drawing_bytes(buffer.getvalue())
+
+
+def reason(d):
+    reply = prefilter_drawing(d)
+    return next((r for r, replies in PREFILTER_REPLIES.items() if reply in replies), None) if reply else None
+
+
+def test_degenerate_drawings_are_answered_locally():
+    avoided = PREFILTER_STATS['llm_calls_avoided']
+    assert reason(drawing()) == 'blank'
+    assert reason(drawing(lambda c: c.ellipse((140, 140, 150, 150), fill='black'))) == 'tiny'
+    assert reason(drawing(lambda c: c.line((20, 150, 280, 150), fill='black', width=4))) == 'line'
+    assert reason(drawing(lambda c: c.rectangle((10, 10, 290, 290), fill='black'))) == 'scribble'
+    assert PREFILTER_STATS['llm_calls_avoided'] == avoided + 4
+
+
+def test_real_drawings_go_to_the_model():
+    house = drawing(lambda c: c.rectangle((80, 140, 220, 260), outline='black', width=5), lambda c: c.line((70, 150, 150, 60, 230, 150), fill='black', width=5))
+    assert prefilter_drawing(house) is None
+    assert house.stats['strokes'] == 1 and 0 < house.stats['coverage'] < 0.1
+
+
+def test_strokes_are_counted_as_separate_blobs():
+    d = drawing(lambda c: c.ellipse((20, 20, 80, 80), outline='black', width=4), lambda c: c.line((150, 50, 280, 250), fill='black', width=4))
+    assert count_strokes(ink_mask(d.pixels)) == 2
@@ -0,0 +1,116 @@
+import asyncio
+import pytest
+
+from components import chatbot
+from components.resilience import CircuitBreaker, LatencyWindow, hedged
+
+
+def test_breaker_opens_after_consecutive_failures_and_closes_after_a_good_trial(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('components.resilience.time.monotonic', lambda: now[0])
+    transitions = []
+    breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=10, on_transition=lambda name, state: transitions.append(state))
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+
+    now[0] += 10
+    assert breaker.allow() and not breaker.allow()  # one trial at a time
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    now[0] += 10
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow()
+    assert transitions == ['open', 'half_open', 'open', 'half_open', 'closed']
+
+
+def test_an_abandoned_trial_frees_the_half_open_slot(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('components.resilience.time.monotonic', lambda: now[0])
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=1)
+    breaker.record_failure()
+    now[0] += 1
+    assert breaker.allow()
+    breaker.abandon()
+    assert breaker.allow() and breaker.state == 'half_open'
+
+
+def test_latency_window_percentile_needs_enough_samples():
+    window = LatencyWindow(size=100, min_samples=10)
+    for i in range(9):
+        window.observe(i)
+    assert window.percentile(95) is None
+    window.observe(9)
+    assert window.percentile(50) == 5 and window.percentile(95) == 9
+
+
+def test_hedge_fires_for_a_slow_call_and_the_first_success_wins():
+    async def scenario():
+        delays = [1.0, 0.01]
+        started = []
+
+        async def call():
+            started.append(len(started))
+            await asyncio.sleep(delays[len(started) - 1])
+            return len(started)
+
+        return await hedged(call, hedge_after=0.02), started
+
+    (result, winner), started = asyncio.run(scenario())
+    assert winner == 1 and started == [0, 1]
+
+
+def test_no_hedge_without_a_delay_or_a_free_slot():
+    async def scenario():
+        calls = 0
+
+        async def call():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.03)
+            return 'ok'
+
+        assert await hedged(call, hedge_after=None) == ('ok', 0)
+        assert await hedged(call, hedge_after=0.01, can_hedge=lambda: False) == ('ok', 0)
+        return calls
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_the_first_calls_exception_surfaces_when_every_call_fails():
+    async def scenario():
+        errors = [ValueError('first'), RuntimeError('hedge')]
+
+        async def call():
+            error = errors.pop(0)
+            await asyncio.sleep(0.03 if isinstance(error, ValueError) else 0)
+            raise error
+
+        await hedged(call, hedge_after=0.01)
+
+    with pytest.raises(ValueError):
+        asyncio.run(scenario())
+
+
+def test_guarded_call_turns_timeouts_and_open_circuits_into_fallback_replies(monkeypatch):
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=60)
+    monkeypatch.setattr(chatbot, 'LLM_BREAKER', breaker)
+    monkeypatch.setattr(chatbot, 'LLM_DEADLINE_SECONDS', 0.02)
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    with pytest.raises(chatbot.ModelUnavailable) as timeout:
+        asyncio.run(chatbot._guarded_call(slow, lambda output: output, 0))
+    assert timeout.value.reason == 'timeout' and timeout.value.reply in chatbot.FALLBACK_REPLIES
+
+    async def fast():
+        return 'never called'
+
+    with pytest.raises(chatbot.ModelUnavailable) as rejected:
+        asyncio.run(chatbot._guarded_call(fast, lambda output: output, 0))
+    assert rejected.value.reason == 'circuit_open'
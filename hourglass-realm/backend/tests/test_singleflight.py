@@ -0,0 +1,145 @@
+import asyncio
+import pytest
+
+from components.singleflight import FlightLimitReached, SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flights = SingleFlight('test')
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return 'done'
+
+        results = await asyncio.gather(*(flights.run('session', 'drawing', work) for _ in range(3)))
+        return results, calls, flights.stats()
+
+    results, calls, stats = asyncio.run(scenario())
+    assert results == ['done'] * 3 and calls == 1
+    assert stats['started'] == 1 and stats['joined'] == 2 and stats['in_flight'] == 0
+
+
+def test_failures_reach_every_caller():
+    async def scenario():
+        flights = SingleFlight('test')
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise RuntimeError('boom')
+
+        return await asyncio.gather(*(flights.run('session', 'drawing', work) for _ in range(2)), return_exceptions=True)
+
+    assert [type(r) for r in asyncio.run(scenario())] == [RuntimeError, RuntimeError]
+
+
+def test_cap_counts_distinct_calls_per_group_and_frees_slots_on_landing():
+    async def scenario():
+        flights = SingleFlight('test', max_per_group=2)
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return 'done'
+
+        first = asyncio.ensure_future(flights.run('a', 1, work))
+        second = asyncio.ensure_future(flights.run('a', 2, work))
+        other_group = asyncio.ensure_future(flights.run('b', 1, work))
+        joiner = asyncio.ensure_future(flights.run('a', 1, work))
+        await asyncio.sleep(0)
+        with pytest.raises(FlightLimitReached):
+            await flights.run('a', 3, work)
+        release.set()
+        await asyncio.gather(first, second, other_group, joiner)
+        assert await flights.run('a', 3, work) == 'done'
+        return flights.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats['limited'] == 1 and stats['joined'] == 1 and stats['groups_in_flight'] == 0
+
+
+def test_stream_replays_every_item_to_late_joiners():
+    async def scenario():
+        flights = SingleFlight('test', max_per_group=1)
+        produced = 0
+
+        async def work():
+            nonlocal produced
+            for item in 'abc':
+                produced += 1
+                yield item
+                await asyncio.sleep(0.01)
+
+        async def collect(items):
+            return [item async for item in items]
+
+        first = asyncio.ensure_future(collect(flights.stream('session', 'drawing', work)))
+        await asyncio.sleep(0.015)
+        joined = flights.stream('session', 'drawing', work)
+        with pytest.raises(FlightLimitReached):
+            flights.stream('session', 'other drawing', work)
+        return await first, await collect(joined), produced, flights.stats()
+
+    first, joined, produced, stats = asyncio.run(scenario())
+    assert first == joined == ['a', 'b', 'c'] and produced == 3
+    assert stats['joined'] == 1 and stats['in_flight'] == 0
+
+
+def test_stream_failures_reach_followers_after_the_items_before_them():
+    async def scenario():
+        flights = SingleFlight('test')
+
+        async def work():
+            yield 'a'
+            raise RuntimeError('boom')
+
+        items = []
+        with pytest.raises(RuntimeError):
+            async for item in flights.stream('session', 'drawing', work):
+                items.append(item)
+        return items
+
+    assert asyncio.run(scenario()) == ['a']
+
+
+def test_run_and_stream_callers_join_each_other():
+    async def scenario():
+        flights = SingleFlight('test', max_per_group=1)
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return 'reply'
+
+        async def items():
+            yield 'a'
+            await release.wait()
+            yield 'b'
+
+        async def last(joined):
+            return [item async for item in joined][-1]
+
+        async def as_items(result):
+            yield 'from ' + await result
+
+        first = asyncio.ensure_future(flights.run('session', 'drawing', work))
+        await asyncio.sleep(0)
+        streamed = asyncio.ensure_future(last(flights.stream('session', 'drawing', items, from_result=as_items)))
+        await asyncio.sleep(0)
+        release.set()
+        ran = await first, await streamed
+
+        release.clear()
+        stream = flights.stream('session', 'other', items)
+        joined = asyncio.ensure_future(flights.run('session', 'other', work, from_items=last))
+        await asyncio.sleep(0)
+        release.set()
+        return ran, [item async for item in stream], await joined, flights.stats()
+
+    ran, streamed, joined, stats = asyncio.run(scenario())
+    assert ran == ('reply', 'from reply')
+    assert streamed == ['a', 'b'] and joined == 'b'
+    assert stats['started'] == 2 and stats['joined'] == 2 and stats['limited'] == 0
@@ -0,0 +1,70 @@
+import pytest
+
+from components.statecache import StateCache
+
+
+class Backend:
+    def __init__(self):
+        self.item = {'version': 1, 'created_at': 'a'}
+        self.loads = 0
+        self.stamps = 0
+
+    def load(self, room_id):
+        self.loads += 1
+        return dict(self.item)
+
+    def load_stamp(self, room_id):
+        self.stamps += 1
+        return self.item['version'], self.item['created_at']
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr('components.statecache.time.monotonic', lambda: now[0])
+    return now
+
+
+def test_reads_within_the_ttl_are_served_from_memory(clock):
+    backend = Backend()
+    cache = StateCache(backend.load, backend.load_stamp, ttl=2)
+    assert cache.get('room') == cache.get('room')
+    assert backend.loads == 1 and backend.stamps == 0
+    assert cache.stats()['hits'] == 1
+
+
+def test_stale_copies_are_revalidated_by_stamp_before_reloading(clock):
+    backend = Backend()
+    cache = StateCache(backend.load, backend.load_stamp, ttl=2)
+    cache.get('room')
+    clock[0] += 3
+    cache.get('room')
+    assert (backend.loads, backend.stamps) == (1, 1)
+    backend.item = {'version': 2, 'created_at': 'a'}
+    clock[0] += 3
+    assert cache.get('room')['version'] == 2
+    assert (backend.loads, backend.stamps) == (2, 2)
+    assert cache.stats()['revalidations'] == 1
+
+
+def test_a_request_sees_one_state_per_room_and_fresh_reads_bypass_it(clock):
+    backend = Backend()
+    cache = StateCache(backend.load, backend.load_stamp, ttl=0)
+    with cache.request_scope():
+        first = cache.get('room')
+        backend.item = {'version': 2, 'created_at': 'a'}
+        assert cache.get('room') is first
+        assert cache.get('room', fresh=True)['version'] == 2
+    assert cache.stats()['memo_hits'] == 1 and backend.loads == 2
+
+
+def test_older_versions_never_replace_newer_ones(clock):
+    backend = Backend()
+    cache = StateCache(backend.load, backend.load_stamp, ttl=2)
+    cache.store('room', {'version': 3, 'created_at': 'a'})
+    cache.store('room', {'version': 2, 'created_at': 'a'})
+    assert cache.get('room')['version'] == 3
+    # A reset starts the version over under a new created_at
+    cache.store('room', {'version': 1, 'created_at': 'b'})
+    assert cache.get('room') == {'version': 1, 'created_at': 'b'}
+    assert backend.loads == 0
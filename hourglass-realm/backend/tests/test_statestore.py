@@ -0,0 +1,107 @@
+import pytest
+
+from components.statestore import JournalStateStore, SQLiteStateStore, open_state_store
+from components.updates import StateUpdate
+
+
+def make_state(count=0):
+    return {'version': 1, 'created_at': '2026-01-01T00:00:00+00:00', 'puzzle_1b': {'stage1_count': count}}
+
+
+def test_sqlite_create_keeps_an_existing_room_unless_replacing(tmp_path):
+    store = SQLiteStateStore(str(tmp_path / 'state.db'))
+    assert store.create('room', make_state())
+    assert not store.create('room', make_state(count=3))
+    assert store.get('room')['puzzle_1b']['stage1_count'] == 0
+    assert store.create('room', make_state(count=3), replace=True)
+    assert store.get('room')['puzzle_1b']['stage1_count'] == 3
+    assert store.get('missing') is None
+
+
+def test_sqlite_update_bumps_the_version_and_checks_conditions(tmp_path):
+    store = SQLiteStateStore(str(tmp_path / 'state.db'))
+    store.create('room', make_state())
+    state = store.update('room', StateUpdate(add={'puzzle_1b.stage1_count': 1}, expect={'puzzle_1b.stage1_count': 0}))
+    assert state['version'] == 2 and state['puzzle_1b']['stage1_count'] == 1
+    assert store.stamp('room') == (2, '2026-01-01T00:00:00+00:00')
+    assert store.update('room', StateUpdate(add={'puzzle_1b.stage1_count': 1}, expect={'puzzle_1b.stage1_count': 0})) is None
+    assert store.update('missing', StateUpdate(add={'puzzle_1b.stage1_count': 1})) is None
+    assert store.get('room')['version'] == 2
+    assert store.stats()['updates'] == 1 and store.stats()['conflicts'] == 1
+
+
+def test_sqlite_stores_on_one_file_see_each_others_writes(tmp_path):
+    path = str(tmp_path / 'state.db')
+    first, second = SQLiteStateStore(path), SQLiteStateStore(path)
+    first.create('a', make_state())
+    second.create('b', make_state())
+    assert first.existing(['a', 'b', 'c']) == second.existing(['a', 'b', 'c']) == {'a', 'b'}
+    for store in (first, second, first):
+        store.update('a', StateUpdate(add={'puzzle_1b.stage1_count': 1}))
+    assert first.stamp('a') == second.stamp('a') == (4, '2026-01-01T00:00:00+00:00')
+    assert [room_id for room_id, _ in second.rooms()] == ['a', 'b']
+    assert second.get('a')['puzzle_1b']['stage1_count'] == 3
+
+
+def test_sqlite_update_reapplies_over_a_write_from_another_worker(tmp_path, monkeypatch):
+    path = str(tmp_path / 'state.db')
+    ours, theirs = SQLiteStateStore(path), SQLiteStateStore(path)
+    ours.create('room', make_state())
+    stale = ours.get('room')
+    theirs.update('room', StateUpdate(set={'puzzle_1b.stage1_progress': {'CAR': True}}))
+    reads = iter([stale])
+    read = ours.get
+    monkeypatch.setattr(ours, 'get', lambda room_id, fresh=False: next(reads, None) or read(room_id))
+    state = ours.update('room', StateUpdate(add={'puzzle_1b.stage1_count': 1}))
+    assert state['version'] == 3 and state['puzzle_1b'] == {'stage1_count': 1, 'stage1_progress': {'CAR': True}}
+    assert ours.stats()['cas_retries'] == 1
+
+
+def test_journal_recovers_the_latest_state_of_every_room(tmp_path):
+    store = JournalStateStore(str(tmp_path), flush_interval=0)
+    store.create('a', make_state())
+    store.create('b', make_state())
+    store.update('a', StateUpdate(add={'puzzle_1b.stage1_count': 1}))
+    reopened = JournalStateStore(str(tmp_path), flush_interval=0)
+    assert reopened.recovered_lines == 3
+    assert reopened.get('a')['version'] == 2 and reopened.get('a')['puzzle_1b']['stage1_count'] == 1
+    assert reopened.get('b') == make_state()
+
+
+def test_journal_drops_a_torn_last_line(tmp_path):
+    store = JournalStateStore(str(tmp_path), flush_interval=0)
+    store.create('a', make_state())
+    with open(store.journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"room": "b", "sta')
+    reopened = JournalStateStore(str(tmp_path), flush_interval=0)
+    assert reopened.recovered_lines == 1 and reopened.get('b') is None
+    reopened.create('b', make_state())
+    assert JournalStateStore(str(tmp_path), flush_interval=0).existing(['a', 'b']) == {'a', 'b'}
+
+
+def test_journal_snapshots_and_starts_over(tmp_path):
+    store = JournalStateStore(str(tmp_path), flush_interval=0, snapshot_every=3)
+    store.create('a', make_state())
+    for _ in range(3):
+        store.update('a', StateUpdate(add={'puzzle_1b.stage1_count': 1}))
+    assert store.snapshots == 1 and store.stats()['journal_lines'] == 1
+    reopened = JournalStateStore(str(tmp_path), flush_interval=0)
+    assert reopened.recovered_lines == 1 and reopened.get('a')['puzzle_1b']['stage1_count'] == 3
+
+
+def test_journal_flushes_pending_writes_and_snapshots_on_close(tmp_path):
+    store = JournalStateStore(str(tmp_path), flush_interval=60)
+    store.start()
+    store.create('a', make_state())
+    store.update('a', StateUpdate(add={'puzzle_1b.stage1_count': 1}))
+    assert store.stats()['pending'] == 1
+    store.close()
+    assert store.coalesced == 1 and store.snapshots == 1
+    reopened = JournalStateStore(str(tmp_path), flush_interval=0)
+    assert reopened.recovered_lines == 0 and reopened.get('a')['version'] == 2
+
+
+def test_unknown_state_store_is_rejected(monkeypatch):
+    monkeypatch.setenv('STATE_STORE', 'postgres')
+    with pytest.raises(ValueError, match='postgres'):
+        open_state_store()
@@ -0,0 +1,49 @@
+import pytest
+from fastapi import HTTPException
+
+from components import tokens
+
+
+@pytest.fixture(autouse=True)
+def secret(monkeypatch):
+    monkeypatch.setenv('SESSION_TOKEN_SECRET', 'test-secret')
+    tokens._secret.cache_clear()
+    yield
+    tokens._secret.cache_clear()
+
+
+def assert_rejected(token):
+    with pytest.raises(HTTPException) as e:
+        tokens.verify_session_token(token)
+    assert e.value.status_code == 403
+
+
+def test_issued_token_verifies():
+    token = tokens.issue_session_token('team-1', 12345)
+    assert tokens.verify_session_token(token) == ('team-1', 12345)
+
+
+def test_tampered_tokens_are_rejected():
+    room, epoch, signature = tokens.issue_session_token('team-1', 12345).split('.')
+    assert_rejected(f'team-2.{epoch}.{signature}')
+    assert_rejected(f'{room}.12346.{signature}')
+    assert_rejected(f'{room}.{epoch}.{signature[:-1]}A' if not signature.endswith('A') else f'{room}.{epoch}.{signature[:-1]}B')
+    assert_rejected(f'{room}.{epoch}.')
+
+
+def test_malformed_and_non_ascii_tokens_are_rejected_not_errors():
+    for token in ['', 'default', 'default.1', 'default.x.abc', 'default.².abc', 'default.1.éé', 'défault.1.abc']:
+        assert_rejected(token)
+
+
+def test_tokens_from_another_secret_are_rejected(monkeypatch):
+    token = tokens.issue_session_token('team-1', 1)
+    monkeypatch.setenv('SESSION_TOKEN_SECRET', 'another-secret')
+    tokens._secret.cache_clear()
+    assert_rejected(token)
+
+
+def test_passphrase_matches():
+    assert tokens.passphrase_matches('open sesame', 'open sesame')
+    assert not tokens.passphrase_matches('open', 'open sesame')
+    assert not tokens.passphrase_matches('ouvre-toi, sésame', 'open sesame')
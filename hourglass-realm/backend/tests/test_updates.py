@@ -0,0 +1,77 @@
+import copy
+import pytest
+
+from components.updates import StateUpdate
+
+
+def make_state():
+    return {'a': {'b': 0, 'flag': False}, 'count': 1, 'items': ['x']}
+
+
+def test_apply_sets_adds_and_appends():
+    state = make_state()
+    update = StateUpdate(set={'a.flag': True}, add={'count': 2}, append={'items': 'y'}, expect={'a.flag': False, 'count': ('<', 2)})
+    assert update.apply(state)
+    assert state == {'a': {'b': 0, 'flag': True}, 'count': 3, 'items': ['x', 'y']}
+
+
+def test_apply_leaves_state_unchanged_when_an_expectation_is_stale():
+    state = make_state()
+    before = copy.deepcopy(state)
+    assert not StateUpdate(set={'a.flag': True}, expect={'count': 2}).apply(state)
+    assert not StateUpdate(add={'count': 1}, expect={'count': ('<', 1)}).apply(state)
+    assert state == before
+
+
+def test_apply_treats_a_missing_path_as_a_failed_expectation():
+    assert not StateUpdate(set={'count': 5}, expect={'a.missing': False}).apply(make_state())
+
+
+def test_to_dynamodb_expressions():
+    update = StateUpdate(set={'a.b': 1}, add={'count': 2}, append={'items': 'y'}, expect={'a.flag': False, 'count': ('<', 3)})
+    kwargs = update.to_dynamodb()
+    assert kwargs['UpdateExpression'] == (
+        'SET #n3.#n4 = :v2, #n5 = list_append(#n5, :v3), #updated_at = :updated_at ADD #v :one, #n6 :v4'
+    )
+    assert kwargs['ConditionExpression'] == 'attribute_exists(#pk) AND #n7.#n8 = :v5 AND #n9 < :v6'
+    names = kwargs['ExpressionAttributeNames']
+    assert [names[f'#n{i}'] for i in range(3, 10)] == ['a', 'b', 'items', 'count', 'a', 'flag', 'count']
+    assert names['#v'] == 'version' and names['#pk'] == 'pk'
+    values = kwargs['ExpressionAttributeValues']
+    assert (values[':v2'], values[':v3'], values[':v4'], values[':v5'], values[':v6']) == (1, ['y'], 2, False, 3)
+    assert values[':one'] == 1 and ':updated_at' in values
+
+
+def test_to_dynamodb_without_changes_still_bumps_the_version():
+    kwargs = StateUpdate().to_dynamodb()
+    assert kwargs['UpdateExpression'] == 'SET #updated_at = :updated_at ADD #v :one'
+    assert kwargs['ConditionExpression'] == 'attribute_exists(#pk)'
+
+
+def test_combine_sets_final_values_on_the_original_expectations():
+    state = make_state()
+    first = StateUpdate(set={'a.flag': True}, add={'count': 1}, expect={'a.flag': False, 'count': ('<', 3)})
+    second = StateUpdate(add={'count': 1}, append={'items': 'z'}, expect={'count': 2})
+    combined = StateUpdate.combine(state, [first, second])
+    assert combined.set == {'a.flag': True, 'count': 3, 'items': ['x', 'z']}
+    assert combined.add == {} and combined.append == {}
+    assert combined.expect == {'a.flag': False, 'count': 1}
+
+    sequential = make_state()
+    first.apply(sequential)
+    second.apply(sequential)
+    once = make_state()
+    assert combined.apply(once)
+    assert once == sequential
+
+
+def test_combine_fails_on_a_state_that_moved():
+    combined = StateUpdate.combine(make_state(), [StateUpdate(add={'count': 1}, expect={'count': 1})])
+    moved = make_state()
+    moved['count'] = 2
+    assert not combined.apply(moved)
+
+
+def test_combine_rejects_updates_that_do_not_apply_in_order():
+    with pytest.raises(ValueError):
+        StateUpdate.combine(make_state(), [StateUpdate(set={'count': 5}, expect={'count': 2})])
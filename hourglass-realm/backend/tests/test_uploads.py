@@ -0,0 +1,92 @@
+import asyncio, io
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+from starlette.requests import Request
+
+from components import uploads
+
+BOUNDARY = 'drawing-boundary'
+
+
+def png(size=30):
+    buffer = io.BytesIO()
+    Image.new('RGB', (size, size), 'white').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def multipart(*files):
+    body = b''
+    for name, data in files:
+        body += (
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"; filename="drawing.png"\r\n'
+            'Content-Type: image/png\r\n\r\n'
+        ).encode() + data + b'\r\n'
+    return body + f'--{BOUNDARY}--\r\n'.encode()
+
+
+def chunked_request(body, content_type, chunk_size=1024):
+    """A request whose body arrives in chunks without a Content-Length; records how many chunks were pulled"""
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+    pulled = []
+
+    async def receive():
+        pulled.append(len(pulled))
+        chunk = chunks[len(pulled) - 1]
+        return {'type': 'http.request', 'body': chunk, 'more_body': len(pulled) < len(chunks)}
+
+    scope = {'type': 'http', 'method': 'POST', 'path': '/chatbot', 'headers': [(b'content-type', content_type.encode())]}
+    return Request(scope, receive), pulled, len(chunks)
+
+
+def read(reader, request):
+    return asyncio.run(reader(request))
+
+
+@pytest.fixture
+def small_limit(monkeypatch):
+    monkeypatch.setattr(uploads, 'MAX_UPLOAD_BYTES', 4096)
+
+
+def test_multipart_drawing_is_read(small_limit):
+    request, _, _ = chunked_request(multipart(('image', png())), f'multipart/form-data; boundary={BOUNDARY}')
+    assert read(uploads.read_drawing, request).pixels.shape == (30, 30, 3)
+
+
+def test_chunked_multipart_over_the_limit_is_cut_off(small_limit):
+    request, pulled, total = chunked_request(multipart(('image', png() + b'\0' * 20000)), f'multipart/form-data; boundary={BOUNDARY}')
+    with pytest.raises(HTTPException) as e:
+        read(uploads.read_drawing, request)
+    assert e.value.status_code == 413
+    assert len(pulled) < total
+
+
+def test_chunked_raw_body_over_the_limit_is_cut_off(small_limit):
+    request, pulled, total = chunked_request(b'\0' * 20000, 'image/png')
+    with pytest.raises(HTTPException) as e:
+        read(uploads.read_drawing, request)
+    assert e.value.status_code == 413 and len(pulled) < total
+
+
+def test_batch_multipart_limits_the_whole_body_and_the_file_count(small_limit, monkeypatch):
+    monkeypatch.setattr(uploads, 'MAX_BATCH_DRAWINGS', 2)
+    request, _, _ = chunked_request(multipart(('image', png()), ('image', png())), f'multipart/form-data; boundary={BOUNDARY}')
+    assert len(read(uploads.read_drawings, request)) == 2
+
+    request, _, _ = chunked_request(multipart(('image', png()), ('image', b'\0' * 9000)), f'multipart/form-data; boundary={BOUNDARY}')
+    with pytest.raises(HTTPException) as e:
+        read(uploads.read_drawings, request)
+    assert e.value.status_code == 413
+
+    request, _, _ = chunked_request(multipart(*[('image', png())] * 3), f'multipart/form-data; boundary={BOUNDARY}')
+    with pytest.raises(HTTPException) as e:
+        read(uploads.read_drawings, request)
+    assert e.value.status_code == 400
+
+
+def test_undecodable_json_is_a_validation_error():
+    # The body is not echoed back: it may be bytes, which would fail to serialize into the 422
+    request, _, _ = chunked_request(png(), 'application/json')
+    with pytest.raises(HTTPException) as e:
+        read(uploads.read_drawing, request)
+    assert e.value.status_code == 422 and all('input' not in error for error in e.value.detail)
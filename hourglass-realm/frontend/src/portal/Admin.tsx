@@ -6,6 +6,7 @@ import utc from 'dayjs/plugin/utc';
 import timezone from 'dayjs/plugin/timezone';
 
 import { API_BASE_URL } from '../utils/constants';
+import { roomQuery } from '../utils/shared';
 import './Portal.css'
 import './Admin.css'
 
@@ -76,7 +77,7 @@ const AdminPanel: React.FC = () => {
     }
     setLoadingGet(true);
     try {
-      const response = await fetch(`${API_BASE_URL}/admin`, {
+      const response = await fetch(`${API_BASE_URL}/admin${roomQuery()}`, {
         method: 'GET',
         headers: {
           'Content-Type': 'application/json',
@@ -118,7 +119,7 @@ const AdminPanel: React.FC = () => {
     };
     setLoadingPost(true);
     try {
-      const response = await fetch(`${API_BASE_URL}/admin`, {
+      const response = await fetch(`${API_BASE_URL}/admin${roomQuery()}`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -167,7 +168,7 @@ const AdminPanel: React.FC = () => {
     }
     setLoadingReset(true);
     try {
-      const response = await fetch(`${API_BASE_URL}/reset`, {
+      const response = await fetch(`${API_BASE_URL}/reset${roomQuery()}`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -11,13 +11,16 @@ interface ChatbotModalProps {
   progressCount: number;
   pins: string[];
   portalToken: string;
+  onProgress?: (puzzle: { count: number; pins: string[] }) => void;
 }
 
-const ChatbotModal: React.FC<ChatbotModalProps> = ({ visible, onClose, progressCount, pins, portalToken }) => {
+const ChatbotModal: React.FC<ChatbotModalProps> = ({ visible, onClose, progressCount, pins, portalToken, onProgress }) => {
   const [displayedPins, setDisplayedPins] = useState<string[]>([]);
   const [botMessage, setBotMessage] = useState<string>('');
   const [userImage, setUserImage] = useState<string | null>(null);
   const [loading, setLoading] = useState(false);
+  // Stays set until the reply stream ends; `loading` (the spinner) clears at the first text
+  const [submitting, setSubmitting] = useState(false);
   const [canReset, setCanReset] = useState(false);
   const canvasRef = useRef<HTMLCanvasElement>(null);
   const [drawing, setDrawing] = useState(false);
@@ -120,31 +123,75 @@ const ChatbotModal: React.FC<ChatbotModalProps> = ({ visible, onClose, progressC
     if (!imageToSend && canvas) {
       imageToSend = canvas.toDataURL('image/png');
     }
-    if (!imageToSend) return;
+    if (!imageToSend || submitting) return;
     setLoading(true);
+    setSubmitting(true);
     try {
-      const response = await fetch(`${API_BASE_URL}/chatbot`, {
+      // Send the PNG as raw bytes when possible, falling back to the base64 JSON body
+      const imageBlob = canvas ? await new Promise<Blob | null>((resolve) => canvas.toBlob(resolve, 'image/png')) : null;
+      const response = await fetch(`${API_BASE_URL}/chatbot/stream`, {
         method: 'POST',
         headers: {
           'Authorization': `Bearer ${portalToken}`,
-          'Content-Type': 'application/json',
+          'Content-Type': imageBlob ? 'image/png' : 'application/json',
         },
-        body: JSON.stringify({
+        body: imageBlob ?? JSON.stringify({
           image_data: imageToSend,
         }),
       });
-      if (response.ok) {
-        const data = await response.json();
-        setBotMessage(data.response);
-        setCanReset(true);
-        setUserImage(null);
-      } else {
+      if (!response.ok || !response.body) {
+        messageApi.error('Failed to process image');
+        return;
+      }
+      // Server-Sent Events: 'text' pieces of the reply as the model writes them, then 'done' with the
+      // final reply and progress, or 'error'
+      setBotMessage('');
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let finished = false;
+      const handleEvent = (frame: string) => {
+        let event = 'message';
+        let data = '';
+        for (const line of frame.split('\n')) {
+          if (line.startsWith('event:')) event = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        }
+        if (!data) return;
+        const payload = JSON.parse(data);
+        if (event === 'text') {
+          setLoading(false);
+          setBotMessage((previous) => previous + payload.text);
+        } else if (event === 'done') {
+          finished = true;
+          setBotMessage(payload.response);
+          setCanReset(true);
+          setUserImage(null);
+          onProgress?.({ count: payload.count, pins: payload.pins });
+        } else if (event === 'error') {
+          finished = true;
+          messageApi.error(payload.detail || 'Failed to process image');
+        }
+      };
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let end;
+        while ((end = buffer.indexOf('\n\n')) >= 0) {
+          handleEvent(buffer.slice(0, end));
+          buffer = buffer.slice(end + 2);
+        }
+      }
+      if (!finished) {
+        // The connection ended before the reply was complete
         messageApi.error('Failed to process image');
       }
     } catch (error) {
       messageApi.error('Error submitting image');
     } finally {
       setLoading(false);
+      setSubmitting(false);
     }
   };
 
@@ -243,8 +290,8 @@ const ChatbotModal: React.FC<ChatbotModalProps> = ({ visible, onClose, progressC
                 onTouchEnd={stopDrawing}
                 style={{
                   touchAction: 'none', // Prevent scrolling while drawing
-                  opacity: (loading || canReset || puzzleComplete) ? 0.5 : 1,
-                  pointerEvents: (loading || canReset || puzzleComplete) ? 'none' : 'auto',
+                  opacity: (submitting || canReset || puzzleComplete) ? 0.5 : 1,
+                  pointerEvents: (submitting || canReset || puzzleComplete) ? 'none' : 'auto',
                 }}
               />
             </div>
@@ -256,7 +303,7 @@ const ChatbotModal: React.FC<ChatbotModalProps> = ({ visible, onClose, progressC
                     type="primary"
                     icon={<DeleteOutlined />}
                     onClick={clearCanvas}
-                    disabled={!userImage || loading || puzzleComplete}
+                    disabled={!userImage || submitting || puzzleComplete}
                   >
                     Clear
                   </Button>
@@ -265,7 +312,7 @@ const ChatbotModal: React.FC<ChatbotModalProps> = ({ visible, onClose, progressC
                     icon={<UploadOutlined />}
                     onClick={submitImage}
                     loading={loading}
-                    disabled={!userImage || puzzleComplete}
+                    disabled={!userImage || submitting || puzzleComplete}
                   >
                     Submit
                   </Button>
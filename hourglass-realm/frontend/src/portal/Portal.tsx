@@ -4,8 +4,8 @@ import { BulbOutlined, FieldTimeOutlined, LockOutlined, QuestionOutlined, RiseOu
 
 import ChatbotModal from './ChatbotModal';
 import { setCookie, getCookie } from '../utils/cookie';
-import { API_BASE_URL, POLL_INTERVAL } from '../utils/constants';
-import { resolvePathwithBase } from '../utils/shared';
+import { API_BASE_URL, EVENTS_FIRST_MESSAGE_TIMEOUT, POLL_INTERVAL } from '../utils/constants';
+import { resolvePathwithBase, roomQuery } from '../utils/shared';
 import './Portal.css';
 import '../styles/antd-override.css';
 import '../styles/background.css';
@@ -71,7 +71,7 @@ const Portal: React.FC = () => {
   const handleEnter = async () => {
     setLoading(true);
     try {
-      const response = await fetch(`${API_BASE_URL}/enter`, {
+      const response = await fetch(`${API_BASE_URL}/enter${roomQuery()}`, {
         method: 'POST',
       });
       if (response.ok) {
@@ -89,6 +89,13 @@ const Portal: React.FC = () => {
     }
   };
 
+  // Session expired or invalid
+  const endSession = () => {
+    setPortalState('welcome');
+    setPortalToken('');
+    messageToast.warning('Your session has ended');
+  };
+
   // Fetch game data
   const fetchGameData = async (currentToken: string) => {
     try {
@@ -102,10 +109,7 @@ const Portal: React.FC = () => {
         setGameData(data);
         audioRef.current?.play();
       } else if (response.status === 403 || response.status === 401) {
-        // Session expired or invalid
-        setPortalState('welcome');
-        setPortalToken('');
-        messageToast.warning('Your session has ended');
+        endSession();
       }
     } catch (error) {
       console.error('Fetch error:', error);
@@ -126,16 +130,55 @@ const Portal: React.FC = () => {
     return `${String(hours).padStart(2, '0')}:${String(minutes).padStart(2, '0')}:${String(seconds).padStart(2, '0')}`;
   };
 
-  // Poll for updates
+  // Subscribe to pushed updates, falling back to polling if the stream is unavailable
   useEffect(() => {
     if (portalToken && portalState === 'main') {
+      let eventSource: EventSource | null = null;
+      let fallbackTimer: ReturnType<typeof setTimeout> | null = null;
+      const startPolling = () => {
+        if (pollIntervalRef.current) return;
+        pollIntervalRef.current = setInterval(() => {
+          fetchGameData(portalToken);
+        }, POLL_INTERVAL);
+      };
+      // Show the game right away, whatever happens to the stream
       fetchGameData(portalToken);
-      pollIntervalRef.current = setInterval(() => {
-        fetchGameData(portalToken);
-      }, POLL_INTERVAL);
+      if (typeof EventSource !== 'undefined') {
+        eventSource = new EventSource(`${API_BASE_URL}/events?token=${encodeURIComponent(portalToken)}`);
+        // The stream sends the state as soon as it opens; when nothing arrives (a buffering proxy), poll instead
+        fallbackTimer = setTimeout(() => {
+          eventSource?.close();
+          startPolling();
+        }, EVENTS_FIRST_MESSAGE_TIMEOUT);
+        eventSource.onmessage = (event) => {
+          if (fallbackTimer) {
+            clearTimeout(fallbackTimer);
+            fallbackTimer = null;
+          }
+          const data: GameData = JSON.parse(event.data);
+          setGameData(data);
+          audioRef.current?.play();
+        };
+        eventSource.addEventListener('expired', () => {
+          eventSource?.close();
+          endSession();
+        });
+        eventSource.onerror = () => {
+          // EventSource retries by itself unless the server refused the stream
+          if (eventSource?.readyState === EventSource.CLOSED) {
+            if (fallbackTimer) clearTimeout(fallbackTimer);
+            startPolling();
+          }
+        };
+      } else {
+        startPolling();
+      }
       return () => {
+        eventSource?.close();
+        if (fallbackTimer) clearTimeout(fallbackTimer);
         if (pollIntervalRef.current) {
           clearInterval(pollIntervalRef.current);
+          pollIntervalRef.current = null;
         }
       };
     }
@@ -386,6 +429,7 @@ const Portal: React.FC = () => {
           progressCount={gameData?.puzzle_1b?.count || 0}
           pins={gameData?.puzzle_1b?.pins || []}
           portalToken={portalToken}
+          onProgress={(puzzle) => setGameData((previous) => previous ? { ...previous, puzzle_1b: puzzle } : previous)}
         />
 
         {/* Credits Button */}
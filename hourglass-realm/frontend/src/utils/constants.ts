@@ -1,6 +1,7 @@
 export const APP_BASE_PATH = import.meta.env.VITE_APP_BASE_PATH || '/';
 export const API_BASE_URL = import.meta.env.VITE_BACKEND_URL || '';
 export const POLL_INTERVAL = 5000; // milliseconds
+export const EVENTS_FIRST_MESSAGE_TIMEOUT = 5000; // milliseconds without a pushed update before polling instead
 
 export const CHATBOT_MESSAGES = [
     'Oh, hi there! I’m the Treasure Guardian… or wait, maybe that’s me! Anyway, you’re here to find treasures, uh… clues!\n\nI’m guarding a secret PIN, but… hmm, I don’t just give it away. No, no—you’ll need to show me five drawings first! Five! Each one is a little clue, a little piece of the puzzle… with some drawings being more important… but shh! I can’t quite remember which one. When I see them all, then, maybe, I’ll share the PIN with you.',
@@ -4,4 +4,10 @@ export const resolvePathwithBase = (path: string): string => {
   const domain = window.location.origin;
   const basePath = APP_BASE_PATH.replace(/\/+$/, ''); // Remove trailing slashes
   return `${domain}${basePath}/${path.replace(/^\/+/, '')}`; // Remove leading slashes
-};
\ No newline at end of file
+};
+
+// Escape room instance from the page URL (?room=...); the backend falls back to its default room
+export const roomQuery = (): string => {
+  const room = new URLSearchParams(window.location.search).get('room');
+  return room ? `?room=${encodeURIComponent(room)}` : '';
+};